@@ -9,12 +9,20 @@ register_game() 自动从游戏目录加载所有 JSON 数据文件：
   - player_data.json  → 用户模板默认值
 
 GAME_INFO 只保留代码级配置（locations, create_engine 等）。
+
+懒加载: register_lazy_game() 只读取 manifest.json（路由所需的 GAME_INFO 元数据）
+和 commands.json，引擎模块与其余 JSON 资源推迟到首次创建引擎（play <游戏>）时
+由 load_game() 加载。
 """
 
+import importlib
 import json
 import os
+import threading
+from types import MappingProxyType
 
-from server.config import register_game_locations, COMMAND_TABLE
+from server.config import register_game_locations, invalidate_location_cache, COMMAND_TABLE
+from server import render_cache
 from server.user_schema import (
     register_game_titles,
     register_game_title_sources,
@@ -28,6 +36,13 @@ from server.user_schema import (
 # 注册的游戏列表
 GAMES = {}
 
+# 位置 → 游戏ID 路由表（register_game 时重建，只读）
+LOCATION_ROUTES = MappingProxyType({})
+# 未声明位置的前缀匹配结果缓存（含 None），随路由表一起失效
+_fallback_routes = {}
+
+_load_lock = threading.RLock()
+
 
 def _load_game_json(module_dir, filename):
     """加载游戏目录下的 JSON 文件，不存在则返回 None"""
@@ -38,12 +53,8 @@ def _load_game_json(module_dir, filename):
     return None
 
 
-def register_game(game_id, game_module):
-    """注册游戏并自动注入所有元数据到框架全局注册表"""
-    GAMES[game_id] = game_module
-    info = getattr(game_module, 'GAME_INFO', {})
-    module_dir = os.path.dirname(game_module.__file__)
-
+def _register_routing(info, module_dir):
+    """注入路由所需元数据：位置层级 + 指令"""
     # ── 位置层级 ──
     if info.get('locations'):
         register_game_locations(info)
@@ -54,7 +65,11 @@ def register_game(game_id, game_module):
         info['commands'] = data
         for loc, cmds in data.items():
             COMMAND_TABLE.setdefault(loc, []).extend(cmds)
+        invalidate_location_cache()
 
+
+def _register_assets(game_id, module_dir):
+    """注入段位 / 头衔 / 物品 / 默认玩家数据"""
     # ── 段位（ranks.json） ──
     data = _load_game_json(module_dir, 'ranks.json')
     if data:
@@ -80,6 +95,118 @@ def register_game(game_id, game_module):
         register_game_player_defaults(game_id, data)
 
 
+def register_game(game_id, game_module):
+    """注册游戏并自动注入所有元数据到框架全局注册表"""
+    GAMES[game_id] = game_module
+    info = getattr(game_module, 'GAME_INFO', {})
+    module_dir = os.path.dirname(game_module.__file__)
+
+    _register_routing(info, module_dir)
+    _register_assets(game_id, module_dir)
+
+    _rebuild_location_routes()
+    render_cache.invalidate()
+
+
+class LazyGame:
+    """懒加载游戏占位 — 只持有 manifest 元数据，首次需要模块内容时导入"""
+
+    def __init__(self, game_id, module_dir, manifest):
+        self.game_id = game_id
+        self.__file__ = os.path.join(module_dir, '__init__.py')
+        self.GAME_INFO = dict(manifest)
+        self.GAME_INFO.setdefault('id', game_id)
+        self.GAME_INFO['create_engine'] = self._create_engine
+
+    def _create_engine(self):
+        module = load_game(self.game_id)
+        return module.GAME_INFO['create_engine']()
+
+    def __getattr__(self, name):
+        # 访问 manifest 之外的属性（get_help_text 等）时加载真实模块
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(load_game(self.game_id), name)
+
+
+def register_lazy_game(game_id):
+    """按 manifest 懒注册 games/<game_id>/（目录需含 manifest.json）"""
+    module_dir = os.path.join(os.path.dirname(__file__), game_id)
+    manifest = _load_game_json(module_dir, 'manifest.json')
+    if manifest is None:
+        raise FileNotFoundError(f'{module_dir}/manifest.json')
+
+    proxy = LazyGame(game_id, module_dir, manifest)
+    GAMES[game_id] = proxy
+    _register_routing(proxy.GAME_INFO, module_dir)
+
+    _rebuild_location_routes()
+    render_cache.invalidate()
+
+
+def is_game_loaded(game_id):
+    return game_id in GAMES and not isinstance(GAMES[game_id], LazyGame)
+
+
+def load_game(game_id):
+    """加载懒注册的游戏模块与资源（幂等），返回真实模块"""
+    with _load_lock:
+        current = GAMES.get(game_id)
+        if not isinstance(current, LazyGame):
+            return current
+
+        module = importlib.import_module(f'{__name__}.{game_id}')
+        info = getattr(module, 'GAME_INFO', {})
+        # manifest 中有而模块未声明的元数据保留；指令已在懒注册时注入
+        for key, value in current.GAME_INFO.items():
+            if key != 'create_engine':
+                info.setdefault(key, value)
+        if info.get('locations'):
+            register_game_locations(info)
+        _register_assets(game_id, os.path.dirname(module.__file__))
+
+        GAMES[game_id] = module
+        _rebuild_location_routes()
+        render_cache.invalidate()
+        print(f"[游戏] 已加载 {game_id}")
+        return module
+
+
+def _rebuild_location_routes():
+    """重建位置路由表（先注册的游戏优先）"""
+    global LOCATION_ROUTES
+    routes = {}
+    for gid, module in GAMES.items():
+        info = getattr(module, 'GAME_INFO', {})
+        for loc in info.get('locations', {}):
+            routes.setdefault(loc, gid)
+    for loc in ('lobby', 'profile'):
+        routes.pop(loc, None)
+    LOCATION_ROUTES = MappingProxyType(routes)
+    _fallback_routes.clear()
+
+
+def get_game_for_location(location):
+    """根据位置确定所属游戏（一次字典查找），大厅/个人资料返回 None"""
+    gid = LOCATION_ROUTES.get(location)
+    if gid is not None:
+        return gid
+    try:
+        return _fallback_routes[location]
+    except KeyError:
+        pass
+    # 后备: 根据前缀（结果缓存）
+    gid = None
+    if location and location not in ('lobby', 'profile'):
+        for game_id in GAMES:
+            if location.startswith(game_id):
+                gid = game_id
+                break
+    if len(_fallback_routes) < 4096:
+        _fallback_routes[location] = gid
+    return gid
+
+
 def get_game(game_id):
     """获取游戏模块"""
     return GAMES.get(game_id)
@@ -98,9 +225,14 @@ def get_all_games():
 # from . import xxx
 # register_game('xxx', xxx)
 #
+# 或懒注册（需 manifest.json，首次 play 时才导入模块和加载资源）:
+# register_lazy_game('xxx')
+#
 # 游戏模块目录结构（JSON 文件均为可选，存在即自动注入）:
 #   games/chess/
 #       __init__.py        — GAME_INFO（id, name, icon, locations, create_engine）
+#       manifest.json      — 懒注册用的 GAME_INFO 元数据（id, name, icon, locations, per_player，
+#                            help_pages: 未加载时 /help 使用的 {页名: 文本}…）
 #       commands.json      — 各位置指令集
 #       ranks.json         — 游戏专属段位体系（可选，不提供则用框架默认）
 #       titles.json        — 游戏头衔 + 来源分类
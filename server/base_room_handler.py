@@ -1,6 +1,27 @@
 """房间制游戏共享指令处理器基类"""
 
+import copy
+import itertools
+import time
+
+from server.config import (
+    INVITE_TTL, ROOM_LIST_PAGE_SIZE, SPECTATOR_BATCH_DELAY, SPECTATOR_MAX_PER_ROOM,
+)
+from server.game_protocol import SharedMessage
+from server.leaderboard import get_leaderboard
+from server.matchmaking import MatchQueue
 from server.player_manager import PlayerManager
+from server.room_index import RoomIndex
+from server.timer_wheel import get_timer_wheel
+
+
+def _redact(data, hidden):
+    """递归去掉 hidden 中的字段"""
+    if isinstance(data, dict):
+        return {k: _redact(v, hidden) for k, v in data.items() if k not in hidden}
+    if isinstance(data, list):
+        return [_redact(v, hidden) for v in data]
+    return data
 
 
 class BaseRoomCommandHandler:
@@ -12,10 +33,37 @@ class BaseRoomCommandHandler:
         _get_match_types(), _get_title_checks(stats),
         _get_rank_points_change(rank, result_data),
         _format_stats(player_data), _format_room_list(rooms)
+
+    房间列表走 self.room_index：引擎在创建房间、开局/结束（state 变化）时
+    调用 _reindex_room(room)，关闭房间时调用 _unindex_room(room_id)；
+    本类内的加入/踢人/添加机器人已自动更新索引。
+
+    段位匹配（/queue）需子类实现 _create_ranked_room(host, match_type)。
+    段位场开局时可调用 _begin_ranked_match(room) 登记本局 match_id，
+    _process_ranked_result 结算时消费它，同一局重复结算会被拒绝；
+    未登记的对局结算时临时生成 ID（照常结算，只是不防重复）。
+
+    旁观（/watch）推送 _public_table_data(room)：默认从 get_table_data() 中
+    去掉 spectator_hidden_keys 字段，子类可覆盖。房间更新经 _build_notify_players /
+    _build_game_notify 自动推送给旁观者，其他更新可调用 _notify_spectators(room)。
     """
 
+    # 旁观视图中隐藏的字段（任意层级）
+    spectator_hidden_keys = frozenset({'hand', 'hands', 'wall', 'deck'})
+
     def __init__(self, engine):
         self.engine = engine
+        self._invite_timers = {}  # 邀请过期定时器 {被邀请者: TimerHandle}
+        self.room_index = RoomIndex()
+        self._room_page_cache = {}  # {(筛选条件, 页码): 渲染文本}，索引 version 变化时清空
+        self._room_page_version = -1
+        self.match_queues = {}  # 段位匹配队列 {match_type: MatchQueue}
+        self.spectators = {}  # {room_id: {旁观者}}
+        self._watching = {}  # {旁观者: room_id}
+        self._spectate_pending = {}  # 待推送 {room_id: (room, [消息])}
+        self._spectate_lobby = None
+        self._match_ids = {}  # 进行中的段位场 {room_id: match_id}，开局登记、结算时消费
+        self._match_seq = itertools.count(1)  # 未登记对局的临时 match_id 序号
 
     def _iter_room_players(self, room, exclude=None):
         """迭代房间内的真人玩家（排除 bots 和 exclude）"""
@@ -28,23 +76,28 @@ class BaseRoomCommandHandler:
             yield p
 
     def _build_notify_players(self, room, message, room_data, exclude=None, location=None):
-        """给房间内其他玩家发送嵌入消息的 room_update"""
+        """给房间内其他玩家发送嵌入消息的 room_update（所有人共享同一份编码）"""
         players = {}
+        shared = SharedMessage({
+            'type': 'room_update', 'room_id': room.room_id, 'message': message, 'room_data': room_data})
+        self._notify_spectators(room, message)
         for p in self._iter_room_players(room, exclude):
-            msgs = [{'type': 'room_update', 'message': message, 'room_data': room_data}]
+            msgs = [shared]
             if location:
                 msgs.append({'type': 'location_update', 'location': location})
             players[p] = msgs
         return players
 
     def _build_game_notify(self, room, message, room_data, exclude=None, location=None, update_last=False):
-        """给房间内其他玩家发送独立的文字+room_update"""
+        """给房间内其他玩家发送独立的文字+room_update（文字与快照各编码一次）"""
         players = {}
+        shared = []
+        if message:
+            shared.append(SharedMessage({'type': 'game', 'text': message, 'update_last': update_last}))
+        shared.append(SharedMessage({'type': 'room_update', 'room_id': room.room_id, 'room_data': room_data}))
+        self._notify_spectators(room, message)
         for p in self._iter_room_players(room, exclude):
-            msgs = []
-            if message:
-                msgs.append({'type': 'game', 'text': message, 'update_last': update_last})
-            msgs.append({'type': 'room_update', 'room_data': room_data})
+            msgs = list(shared)
             if location:
                 msgs.append({'type': 'location_update', 'location': location})
             players[p] = msgs
@@ -85,6 +138,31 @@ class BaseRoomCommandHandler:
             text += f" / {points_up}pt"
         text += f"\n升段进度: [{progress_bar}] {progress}%\n"
         text += f"历史最高: {max_rank_info['name']}\n"
+        pos = get_leaderboard(self.game_key).position(player_data.get('name'))
+        if pos:
+            text += f"排行榜:   第 {pos[0]} / {pos[1]} 名\n"
+        return text
+
+    def _cmd_top(self, player_name, args=None):
+        """段位排行榜前 N 名 + 自己的名次"""
+        from server.user_schema import get_rank_name
+        try:
+            n = max(1, min(50, int((args or '').strip() or 10)))
+        except ValueError:
+            n = 10
+
+        board = get_leaderboard(self.game_key)
+        rows = board.top(n)
+        if not rows:
+            return "排行榜暂无数据。"
+
+        text = f"【{self.game_name}段位排行榜】\n\n"
+        for i, (name, rank_id, points) in enumerate(rows, 1):
+            mark = " ←" if name == player_name else ""
+            text += f"  {i:>2}. {name}  {get_rank_name(rank_id, self.game_key)} {points}pt{mark}\n"
+        pos = board.position(player_name)
+        if pos and pos[0] > n:
+            text += f"\n你的名次: 第 {pos[0]} / {pos[1]} 名\n"
         return text
 
     def _cmd_invite(self, lobby, player_name, player_data, args):
@@ -105,6 +183,7 @@ class BaseRoomCommandHandler:
             return f"{target} 已经在一个房间中了。"
 
         engine.send_invite(player_name, target, room.room_id)
+        self._schedule_invite_expiry(target, room.room_id)
         lobby._track_invite(player_name, player_data)
 
         if lobby.invite_callback:
@@ -118,6 +197,20 @@ class BaseRoomCommandHandler:
 
         return f"已向 {target} 发送邀请"
 
+    def _schedule_invite_expiry(self, target, room_id):
+        """INVITE_TTL 秒后清除邀请（新邀请覆盖旧邀请的定时器）"""
+        wheel = get_timer_wheel()
+        wheel.cancel(self._invite_timers.pop(target, None))
+        self._invite_timers[target] = wheel.schedule(
+            INVITE_TTL, self._expire_invite, target, room_id)
+
+    def _expire_invite(self, target, room_id):
+        """定时轮回调：邀请仍指向同一房间时清除"""
+        self._invite_timers.pop(target, None)
+        invite = self.engine.get_invite(target)
+        if invite and invite.get('room_id') == room_id:
+            self.engine.clear_invite(target)
+
     def _cmd_accept_invite(self, lobby, player_name, player_data):
         """接受邀请"""
         engine = self.engine
@@ -128,6 +221,8 @@ class BaseRoomCommandHandler:
 
         room_id = invite['room_id']
         engine.clear_invite(player_name)
+        self._leave_queues(player_name)
+        get_timer_wheel().cancel(self._invite_timers.pop(player_name, None))
 
         room, error = engine.join_room(room_id, player_name)
         if error:
@@ -139,12 +234,13 @@ class BaseRoomCommandHandler:
         lobby.set_player_location(player_name, self.room_location)
         pos = room.get_position(player_name)
 
+        self._reindex_room(room)
         table_data = room.get_table_data()
         return {
             'action': f'{self.action_prefix}_room_update',
             'send_to_caller': [
                 {'type': 'game', 'text': f"✓ 接受邀请加入成功\n\n  房间ID: {room.room_id}\n  位置:   {room.POSITIONS[pos]}\n\n  等待开始 ({room.get_player_count()}/{self.max_players})"},
-                {'type': 'room_update', 'room_data': table_data},
+                {'type': 'room_update', 'room_id': room.room_id, 'room_data': table_data},
                 {'type': 'location_update', 'location': self.room_location},
             ],
             'send_to_players': self._build_notify_players(
@@ -152,10 +248,309 @@ class BaseRoomCommandHandler:
             'save': True,
         }
 
+    # ==================== 房间列表 ====================
+
+    def _reindex_room(self, room):
+        """房间状态/人数变化后更新索引"""
+        self.room_index.update(room, self.max_players - room.get_player_count())
+
+    def _unindex_room(self, room_id):
+        """房间关闭后移出索引，取消该房间的延时任务，并通知旁观者"""
+        self.room_index.remove(room_id)
+        get_timer_wheel().cancel_key((self.game_key, room_id))
+        self._match_ids.pop(room_id, None)
+        if self.spectators.get(room_id):
+            self._flush_spectators(room_id, closed=True)
+
+    def _parse_room_filters(self, args):
+        """解析 /rooms 参数: [页码] [场次类型] [waiting|playing|all]"""
+        page, match_type, state = 1, None, 'waiting'
+        match_types = self._get_match_types()
+        for token in (args or '').split():
+            if token.isdigit():
+                page = max(1, int(token))
+            elif token in ('waiting', 'playing'):
+                state = token
+            elif token == 'all':
+                state = None
+            elif token in match_types:
+                match_type = token
+        return page, match_type, state
+
+    def _cmd_rooms(self, player_name, args=None):
+        """分页列出房间（只渲染当前页）"""
+        page, match_type, state = self._parse_room_filters(args)
+        index = self.room_index
+
+        # 清理引擎已关闭但未移出索引的房间（只检查当前页）
+        while True:
+            rooms, total = index.page(page, ROOM_LIST_PAGE_SIZE, state, match_type)
+            stale = [r.room_id for r in rooms if self.engine.get_room(r.room_id) is not r]
+            if not stale:
+                break
+            for room_id in stale:
+                index.remove(room_id)
+
+        if index.version != self._room_page_version:
+            self._room_page_cache.clear()
+            self._room_page_version = index.version
+        cache_key = (state, match_type, page)
+        text = self._room_page_cache.get(cache_key)
+        if text is None:
+            pages = max(1, -(-total // ROOM_LIST_PAGE_SIZE))
+            if not rooms:
+                text = "暂无房间。" if page == 1 else f"没有第 {page} 页（共 {pages} 页）。"
+            else:
+                text = self._format_room_list(rooms)
+                text += f"\n第 {page}/{pages} 页，共 {total} 个房间"
+                if page < pages:
+                    text += f"  输入 /rooms {page + 1} 查看下一页"
+            self._room_page_cache[cache_key] = text
+        return text
+
+    # ==================== 段位匹配 ====================
+
+    def _check_rank_requirement(self, player_data, match_info):
+        """段位是否满足场次要求，不满足返回提示文本"""
+        from server.user_schema import get_rank_name, get_rank_table
+        _gk = self.game_key
+        table = get_rank_table(_gk)
+        player_rank = player_data.get(_gk, {}).get('rank', 'novice_1')
+        min_rank = match_info.get('min_rank', 'novice_1')
+        if table.rank_index(player_rank) < table.rank_index(min_rank):
+            return f"段位不足！{match_info.get('name_cn', '')}需要 {get_rank_name(min_rank, _gk)} 以上。"
+        return None
+
+    def _get_match_queue(self, match_type):
+        from server.user_schema import get_rank_order
+        queue = self.match_queues.get(match_type)
+        if queue is None:
+            queue = self.match_queues[match_type] = MatchQueue(
+                len(get_rank_order(self.game_key)), self.max_players)
+        return queue
+
+    def _leave_queues(self, player_name):
+        """退出所有匹配队列。Returns: 是否在队列中"""
+        return any([q.dequeue(player_name) for q in self.match_queues.values()])
+
+    def _cmd_queue(self, lobby, player_name, player_data, args):
+        """加入段位匹配队列"""
+        from server.user_schema import get_rank_index
+        if lobby.get_player_location(player_name) != self.game_key:
+            return f"请先返回{self.game_name}大厅再匹配。"
+        if self.engine.get_player_room(player_name):
+            return "你已经在房间中了。"
+
+        ranked = {k: v for k, v in self._get_match_types().items() if v.get('ranked')}
+        match_type = (args or '').strip()
+        if match_type not in ranked:
+            names = ', '.join(f"{k}({v.get('name_cn', k)})" for k, v in ranked.items())
+            return f"用法: /queue <场次>\n可选场次: {names}"
+
+        error = self._check_rank_requirement(player_data, ranked[match_type])
+        if error:
+            return error
+
+        self._leave_queues(player_name)
+        rank = player_data.get(self.game_key, {}).get('rank', 'novice_1')
+        queue = self._get_match_queue(match_type)
+        queue.enqueue(player_name, get_rank_index(rank, self.game_key))
+        lobby.register_matchmaker(self)
+        return (f"已加入{ranked[match_type].get('name_cn', match_type)}匹配队列（当前 {len(queue)} 人）\n"
+                f"凑齐 {self.max_players} 人后自动建房，输入 /unqueue 取消匹配")
+
+    def _cmd_unqueue(self, player_name):
+        """取消匹配"""
+        if self._leave_queues(player_name):
+            return "已取消匹配。"
+        return "你不在匹配队列中。"
+
+    def handle_player_offline(self, player_name):
+        """玩家下线：退出匹配队列与旁观"""
+        self._leave_queues(player_name)
+        self._stop_watching(player_name)
+
+    def has_queued_players(self):
+        return any(len(q) for q in self.match_queues.values())
+
+    def _match_tick(self, lobby):
+        """匹配检查：凑齐的玩家自动建房。Returns: 需分发的结果列表"""
+        results = []
+        for match_type, queue in list(self.match_queues.items()):
+            for group in queue.take_groups():
+                try:
+                    result = self._start_group(lobby, match_type, queue, group)
+                except Exception as e:
+                    # 已出队的玩家不能丢：没进房间的在线玩家回队（保留等待时间）
+                    print(f"[匹配] {self.game_key} 建房异常 {group}: {e}")
+                    for p in group:
+                        try:
+                            if p in lobby.online_players and not self.engine.get_player_room(p):
+                                self._requeue(lobby, queue, p)
+                        except Exception:
+                            pass
+                    continue
+                if result:
+                    results.append(result)
+        return results
+
+    def _start_group(self, lobby, match_type, queue, group):
+        """处理一个成组的匹配。Returns: 需分发的结果或 None"""
+        # 入队后已离线/进房/离开大厅的玩家放弃本组，其余人回队
+        ready = [p for p in group
+                 if p in lobby.online_players
+                 and lobby.get_player_location(p) == self.game_key
+                 and not self.engine.get_player_room(p)]
+        if len(ready) < len(group):
+            for p in ready:
+                self._requeue(lobby, queue, p)
+            return None
+        return self._start_matched_room(lobby, match_type, group, queue)
+
+    def _requeue(self, lobby, queue, player_name):
+        from server.user_schema import get_rank_index
+        rank = lobby.online_players[player_name].get(self.game_key, {}).get('rank', 'novice_1')
+        queue.requeue(player_name, get_rank_index(rank, self.game_key))
+
+    def _start_matched_room(self, lobby, match_type, players, queue):
+        """为匹配成功的玩家建房并全部入座（入座失败的玩家回队，保留等待时间）"""
+        host = players[0]
+        room = self._create_ranked_room(host, match_type)
+        if not room:
+            for p in players:
+                self._requeue(lobby, queue, p)
+            return None
+        seated = [host]
+        for p in players[1:]:
+            _, error = self.engine.join_room(room.room_id, p)
+            if error:
+                print(f"[匹配] {self.game_key} 加入房间 {room.room_id} 失败 {p}: {error}")
+                self._requeue(lobby, queue, p)
+            else:
+                seated.append(p)
+        players = seated
+
+        for p in players:
+            pd = lobby.online_players.get(p, {})
+            room.set_player_avatar(p, pd.get('avatar'))
+            room.set_player_rank(p, pd.get(self.game_key, {}).get('rank', 'novice_1'))
+            lobby.set_player_location(p, self.room_location)
+        self._reindex_room(room)
+
+        room_update = SharedMessage({
+            'type': 'room_update', 'room_id': room.room_id, 'room_data': room.get_table_data()})
+        text = f"✓ 匹配成功！\n\n  房间ID:  {room.room_id}\n  房主:    {room.host}\n\n"
+        text += "人已齐！房主可以输入 /start 开始游戏" if room.is_full() else "等待玩家入座..."
+        return {
+            'action': f'{self.action_prefix}_room_update',
+            'send_to_players': {
+                p: [
+                    {'type': 'game', 'text': text},
+                    room_update,
+                    {'type': 'location_update', 'location': self.room_location},
+                ]
+                for p in players
+            },
+        }
+
+    # ==================== 旁观 ====================
+
+    def _public_table_data(self, room):
+        """旁观者可见的桌面数据"""
+        return _redact(room.get_table_data(), self.spectator_hidden_keys)
+
+    def _stop_watching(self, player_name):
+        """停止旁观。Returns: 原旁观的 room_id（没有为 None）"""
+        room_id = self._watching.pop(player_name, None)
+        if room_id is not None:
+            watchers = self.spectators.get(room_id)
+            if watchers:
+                watchers.discard(player_name)
+                if not watchers:
+                    del self.spectators[room_id]
+        return room_id
+
+    def _cmd_watch(self, lobby, player_name, player_data, args):
+        """旁观房间"""
+        if lobby.get_player_location(player_name) != self.game_key:
+            return f"请先返回{self.game_name}大厅再旁观。"
+        if self.engine.get_player_room(player_name):
+            return "你已经在房间中了。"
+        if not args:
+            return "用法: /watch <房间ID>\n使用 /rooms playing 查看对局中的房间。"
+
+        room_id = args.strip()
+        room = self.engine.get_room(room_id)
+        if not room:
+            return "房间不存在。"
+        watchers = self.spectators.get(room_id, ())
+        if player_name not in watchers and len(watchers) >= SPECTATOR_MAX_PER_ROOM:
+            return "该房间旁观人数已满。"
+
+        self._stop_watching(player_name)
+        self._leave_queues(player_name)
+        self.spectators.setdefault(room_id, set()).add(player_name)
+        self._watching[player_name] = room_id
+        self._spectate_lobby = lobby
+        lobby.register_room_handler(self)
+
+        return {
+            'action': f'{self.action_prefix}_spectate',
+            'send_to_caller': [
+                {'type': 'game', 'text': f"正在旁观房间 {room_id}（{len(self.spectators[room_id])} 人旁观）\n输入 /unwatch 停止旁观"},
+                {'type': 'spectate_update', 'room_id': room_id, 'messages': [],
+                 'room_data': self._public_table_data(room)},
+            ],
+        }
+
+    def _cmd_unwatch(self, player_name):
+        """停止旁观"""
+        room_id = self._stop_watching(player_name)
+        if room_id is None:
+            return "你没有在旁观。"
+        return f"已停止旁观房间 {room_id}。"
+
+    def _notify_spectators(self, room, message=None):
+        """登记一次房间更新；同一房间 SPECTATOR_BATCH_DELAY 内的更新合并推送"""
+        room_id = room.room_id
+        if not self.spectators.get(room_id):
+            return
+        pending = self._spectate_pending.get(room_id)
+        if pending is None:
+            pending = self._spectate_pending[room_id] = (room, [])
+            get_timer_wheel().schedule(SPECTATOR_BATCH_DELAY, self._flush_spectators, room_id)
+        if message:
+            pending[1].append(message)
+
+    def _flush_spectators(self, room_id, closed=False):
+        """向旁观者推送合并后的公开视图（一帧编码一次）"""
+        _, messages = self._spectate_pending.pop(room_id, (None, []))
+        lobby = self._spectate_lobby
+        if not lobby or not lobby.dispatch_callback:
+            return
+        # 已离开游戏大厅的旁观者不再推送
+        for p in list(self.spectators.get(room_id, ())):
+            if lobby.get_player_location(p) != self.game_key:
+                self._stop_watching(p)
+        watchers = list(self.spectators.get(room_id, ()))
+        if not watchers:
+            return
+
+        frame = {'type': 'spectate_update', 'room_id': room_id, 'messages': messages}
+        room = None if closed else self.engine.get_room(room_id)
+        if room is None:
+            frame['closed'] = True
+            for p in watchers:
+                self._stop_watching(p)
+        else:
+            frame['room_data'] = self._public_table_data(room)
+
+        lobby.dispatch_callback({
+            'send_to_group': {'players': watchers, 'messages': [SharedMessage(frame)]},
+        })
+
     def _cmd_join(self, lobby, player_name, player_data, args):
         """加入房间"""
-        from server.user_schema import get_rank_name, get_rank_index
-        _gk = self.game_key
         engine = self.engine
         avatar = player_data.get('avatar')
         location = lobby.get_player_location(player_name)
@@ -176,14 +571,14 @@ class BaseRoomCommandHandler:
         match_info = match_types.get(room.match_type, {})
 
         if match_info.get('ranked'):
-            player_rank = player_data.get(self.game_key, {}).get('rank', 'novice_1')
-            min_rank = match_info.get('min_rank', 'novice_1')
-            if get_rank_index(player_rank, _gk) < get_rank_index(min_rank, _gk):
-                return f"段位不足！{match_info.get('name_cn', '')}需要 {get_rank_name(min_rank, _gk)} 以上。"
+            error = self._check_rank_requirement(player_data, match_info)
+            if error:
+                return error
 
         room, error = engine.join_room(room_id, player_name)
         if error:
             return f"{error}"
+        self._leave_queues(player_name)
 
         room.set_player_avatar(player_name, avatar)
         player_rank = player_data.get(self.game_key, {}).get('rank', 'novice_1')
@@ -201,12 +596,13 @@ class BaseRoomCommandHandler:
         if room.is_full():
             notify_msg += "\n人已齐！房主可以输入 /start 开始游戏"
 
+        self._reindex_room(room)
         table_data = room.get_table_data()
         return {
             'action': f'{self.action_prefix}_room_update',
             'send_to_caller': [
                 {'type': 'game', 'text': join_msg},
-                {'type': 'room_update', 'room_data': table_data},
+                {'type': 'room_update', 'room_id': room.room_id, 'room_data': table_data},
                 {'type': 'location_update', 'location': self.room_location},
             ],
             'send_to_players': self._build_notify_players(
@@ -252,12 +648,13 @@ class BaseRoomCommandHandler:
         if room.is_full():
             notify_msg += f"\n人已齐！房主可以输入 /start 开始"
 
+        self._reindex_room(room)
         table_data = room.get_table_data()
         return {
             'action': f'{self.action_prefix}_room_update',
             'send_to_caller': [
                 {'type': 'game', 'text': f"✓ 已添加机器人: {bot_names}" + ("\n人已齐，输入 /start 开始" if room.is_full() else "")},
-                {'type': 'room_update', 'room_data': table_data},
+                {'type': 'room_update', 'room_id': room.room_id, 'room_data': table_data},
             ],
             'send_to_players': self._build_notify_players(
                 room, notify_msg, table_data, exclude=player_name),
@@ -315,12 +712,13 @@ class BaseRoomCommandHandler:
         if is_bot:
             room.bots.discard(target_name)
 
+        self._reindex_room(room)
         table_data = room.get_table_data()
         return {
             'action': f'{self.action_prefix}_player_kick',
             'send_to_caller': [
                 {'type': 'game', 'text': f"已踢出: {target_name}"},
-                {'type': 'room_update', 'room_data': table_data},
+                {'type': 'room_update', 'room_id': room.room_id, 'room_data': table_data},
             ],
             'send_to_players': self._build_notify_players(
                 room, f"{target_name} 被踢出了房间", table_data, exclude=player_name),
@@ -328,71 +726,77 @@ class BaseRoomCommandHandler:
 
     # ==================== 段位 & 统计 ====================
 
+    def _begin_ranked_match(self, room):
+        """段位场开局：登记本局 match_id（结算幂等的依据）。Returns: match_id"""
+        match_id = f"{self.game_key}_{room.room_id}_{int(time.time() * 1000)}"
+        self._match_ids[room.room_id] = match_id
+        return match_id
+
     def _process_ranked_result(self, lobby, room, result_data):
-        """处理段位场结果，返回 rank_changes dict"""
-        from server.user_schema import (
-            get_rank_info, get_rank_name, get_rank_index,
-            get_title_id_from_rank, get_rank_order
-        )
+        """处理段位场结果，返回 rank_changes dict
+
+        在数据副本上计算全部参与者的变化，经 PlayerManager.settle_match 一次提交；
+        match_id 取 result_data['match_id']，否则取 _begin_ranked_match 登记的本局 ID，
+        都没有时临时生成（用于事务日志命名）。同一 match_id 重复结算时不做任何修改，返回 {}。
+        """
+        from server.user_schema import get_rank_name, get_rank_table, get_title_id_from_rank
 
         _gk = self.game_key
-        rank_order = get_rank_order(_gk)
+        table = get_rank_table(_gk)
+        match_id = (result_data.get('match_id') or self._match_ids.get(room.room_id)
+                    or f"{_gk}_{room.room_id}_{int(time.time() * 1000)}_{next(self._match_seq)}")
         rank_changes = {}
+        staged = {}  # {player_name: (原数据, 结算后的副本)}
 
         for player_name, outcome_data in self._iter_ranked_players(room, result_data):
-            player_data = self._load_player(lobby, player_name)
-            if not player_data:
+            live_data = self._load_player(lobby, player_name)
+            if not live_data:
                 continue
+            player_data = copy.deepcopy(live_data)
 
             game_data = player_data.get(_gk, {})
-            current_rank = game_data.get('rank', rank_order[0])
+            current_rank = game_data.get('rank', table.lowest)
             current_points = game_data.get('rank_points', 0)
 
             points_change = self._get_rank_points_change(current_rank, outcome_data)
             new_points = max(0, current_points + points_change)
 
-            rank_info = get_rank_info(current_rank, _gk)
+            rank_info = table.info(current_rank)
+            rank_key = current_rank if current_rank in table.index else table.lowest
             new_rank = current_rank
             promoted = False
             demoted = False
 
             # 升段检查
             points_up = rank_info.get('points_up')
-            if points_up and new_points >= points_up:
-                idx = get_rank_index(current_rank, _gk)
-                if idx < len(rank_order) - 1:
-                    new_rank = rank_order[idx + 1]
-                    new_points = 0
-                    promoted = True
+            if points_up and new_points >= points_up and table.next_rank[rank_key]:
+                new_rank = table.next_rank[rank_key]
+                new_points = 0
+                promoted = True
 
             # 降段检查
             points_down = rank_info.get('points_down')
-            if points_down is not None and current_points + points_change < 0:
-                idx = get_rank_index(current_rank, _gk)
-                if idx > 0:
-                    prev_rank = rank_order[idx - 1]
-                    prev_info = get_rank_info(prev_rank, _gk)
-                    if rank_info['tier'] > 2 or (rank_info['tier'] == 2 and prev_info['tier'] == 2):
-                        new_rank = prev_rank
-                        new_points = prev_info.get('points_up', 40) // 2
-                        demoted = True
+            if points_down is not None and current_points + points_change < 0 and table.demote_to[rank_key]:
+                new_rank = table.demote_to[rank_key]
+                new_points = table.demote_points[rank_key]
+                demoted = True
 
             game_data['rank'] = new_rank
             game_data['rank_points'] = new_points
+            game_data['season_games'] = game_data.get('season_games', 0) + 1
 
-            if get_rank_index(new_rank, _gk) > get_rank_index(game_data.get('max_rank', rank_order[0]), _gk):
+            if table.rank_index(new_rank) > table.rank_index(game_data.get('max_rank', table.lowest)):
                 game_data['max_rank'] = new_rank
 
-            if promoted:
-                title_id = get_title_id_from_rank(new_rank)
-                if title_id:
-                    titles = player_data.get('titles', {'owned': ['newcomer'], 'displayed': ['newcomer']})
-                    if title_id not in titles['owned']:
-                        titles['owned'].append(title_id)
-                    player_data['titles'] = titles
+            title_id = get_title_id_from_rank(new_rank) if promoted else None
+            if title_id:
+                titles = player_data.get('titles', {'owned': ['newcomer'], 'displayed': ['newcomer']})
+                if title_id not in titles['owned']:
+                    titles['owned'].append(title_id)
+                player_data['titles'] = titles
 
             player_data[_gk] = game_data
-            PlayerManager.save_player_data(player_name, player_data)
+            staged[player_name] = (live_data, player_data, title_id)
 
             rank_changes[player_name] = {
                 'points_change': points_change,
@@ -404,6 +808,25 @@ class BaseRoomCommandHandler:
                 'demoted': demoted,
             }
 
+        if staged and not PlayerManager.settle_match(
+                match_id, {name: data for name, (_, data, _) in staged.items()}):
+            self._match_ids.pop(room.room_id, None)
+            return {}
+        if self._match_ids.get(room.room_id) == match_id:
+            del self._match_ids[room.room_id]
+        # 提交成功后只把结算涉及的字段写回在线缓存，期间其他指令对在线数据的修改不受影响
+        for live_data, player_data, title_id in staged.values():
+            live_data[_gk] = player_data[_gk]
+            if title_id:
+                titles = live_data.setdefault('titles', {'owned': ['newcomer'], 'displayed': ['newcomer']})
+                if title_id not in titles['owned']:
+                    titles['owned'].append(title_id)
+
+        board = get_leaderboard(_gk)
+        for player_name, change in rank_changes.items():
+            board.update(player_name, change['new_rank'], change['new_points'])
+        if rank_changes:
+            board.save()
         return rank_changes
 
     def _check_titles(self, player_data, stats):
@@ -442,3 +865,7 @@ class BaseRoomCommandHandler:
     def _iter_ranked_players(self, room, result_data):
         """迭代参与段位结算的 (player_name, outcome_data)"""
         raise NotImplementedError
+
+    def _create_ranked_room(self, host, match_type):
+        """为匹配成功的玩家创建段位场房间（host 已入座），返回 room"""
+        raise NotImplementedError
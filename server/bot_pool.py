@@ -0,0 +1,119 @@
+"""
+Bot 决策进程池 — 把 CPU 密集的 AI 计算移出大厅进程（可选）
+
+Bot 调度器提交 (决策函数, 房间快照, 应用函数)：
+  - 决策函数 decide(snapshot) 在工作进程中执行，必须是模块顶层函数（可 pickle），
+    快照只含可 pickle 的纯数据（如 get_table_data() 的结果）
+  - 应用函数 apply(decision) 回到大厅进程执行，返回 Rich Result（或 None），
+    经 dispatch_game_result 投递；房间状态可能已变化，apply 需自行校验（如比对快照中的版本号）
+
+BOT_POOL_ENABLED 为 False 时在调用线程内直接执行，流程不变。
+工作进程崩溃时下次提交自动重建进程池。
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .config import BOT_POOL_ENABLED, BOT_POOL_WORKERS
+
+
+class BotDecisionPool:
+    """Bot 决策执行器"""
+
+    def __init__(self, enabled=BOT_POOL_ENABLED, workers=BOT_POOL_WORKERS):
+        self.enabled = enabled
+        self.workers = workers
+        self.dispatch_callback = None
+        self.lock = threading.Lock()
+        self._executor = None
+
+    def set_dispatch_callback(self, callback):
+        """设置结果分发回调（ChatServer.dispatch_game_result）"""
+        self.dispatch_callback = callback
+
+    def _get_executor(self):
+        with self.lock:
+            if self._executor is None:
+                # spawn：大厅进程有大量线程和锁，fork 出的子进程可能死锁
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _reset_executor(self, broken):
+        with self.lock:
+            if self._executor is broken:
+                self._executor = None
+        try:
+            broken.shutdown(wait=False)
+        except Exception:
+            pass
+
+    def submit(self, decide, snapshot, apply):
+        """提交一次 Bot 决策"""
+        name = getattr(decide, '__name__', decide)
+        if not self.enabled:
+            try:
+                decision = decide(snapshot)
+            except Exception as e:
+                print(f"[Bot进程池] 决策异常 {name}: {e}")
+                return
+            self._apply(apply, decision)
+            return
+
+        executor = self._get_executor()
+        try:
+            try:
+                future = executor.submit(decide, snapshot)
+            except BrokenProcessPool:
+                print("[Bot进程池] 进程池已损坏，重建后重试")
+                self._reset_executor(executor)
+                executor = self._get_executor()
+                future = executor.submit(decide, snapshot)
+        except Exception as e:
+            print(f"[Bot进程池] 提交决策失败 {name}: {e}")
+            return
+
+        def _done(fut):
+            try:
+                decision = fut.result()
+            except BrokenProcessPool:
+                print("[Bot进程池] 工作进程崩溃，进程池将重建")
+                self._reset_executor(executor)
+                return
+            except Exception as e:
+                print(f"[Bot进程池] 决策异常 {name}: {e}")
+                return
+            self._apply(apply, decision)
+
+        future.add_done_callback(_done)
+
+    def _apply(self, apply, decision):
+        try:
+            result = apply(decision)
+        except Exception as e:
+            print(f"[Bot进程池] 应用决策异常: {e}")
+            return
+        if result and self.dispatch_callback:
+            self.dispatch_callback(result)
+
+    def shutdown(self):
+        with self.lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_bot_pool():
+    """进程共享的 Bot 决策执行器"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BotDecisionPool()
+    return _pool
@@ -0,0 +1,162 @@
+"""
+聊天记录归档 — gzip 压缩存储 + 透明读取
+
+归档文件: history/{日期}_channel_{频道标签}.json.gz
+频道标签由 channel_tag() 生成（公共频道为数字，其余百分号编码且 '.' 也编码，
+'room:mahjong:12' → 'room%3Amahjong%3A12'），可无歧义还原。
+旧版未压缩的 history/{日期}_channel_{频道}.json 仍可直接读取，
+启动时由 compress_legacy_archives() 统一转为压缩格式。
+旧版以 '.' 代替 ':' 的标签（'room.mahjong.12'）仍可读取，下次写入同一天归档时合并到新文件名。
+"""
+
+import gzip
+import json
+import os
+from urllib.parse import quote, unquote
+
+from .config import CHAT_HISTORY_DIR, CHAT_ARCHIVE_COMPRESSLEVEL
+
+ARCHIVE_SUFFIX = '.json.gz'
+LEGACY_SUFFIX = '.json'
+
+
+def channel_tag(channel):
+    """频道标识 → 文件名安全的标签（新标签中不含 '.'，据此与旧版标签区分）"""
+    return quote(str(channel), safe='').replace('.', '%2E')
+
+
+def legacy_channel_tag(channel):
+    """旧版标签（':' → '.'），仅用于读取升级前的文件"""
+    return str(channel).replace(':', '.')
+
+
+def parse_channel_tag(tag):
+    """文件名标签 → 频道标识（数字标签还原为 int，兼容旧版标签）"""
+    if tag.isdigit():
+        return int(tag)
+    if '.' in tag:
+        return tag.replace('.', ':')
+    return unquote(tag)
+
+
+def _archive_path(date_str, channel, suffix=ARCHIVE_SUFFIX):
+    return os.path.join(CHAT_HISTORY_DIR, f'{date_str}_channel_{channel_tag(channel)}{suffix}')
+
+
+def _existing_paths(date_str, channel):
+    """该日期/频道已有的归档文件，按合并顺序（新标签压缩 → 旧格式 → 旧版标签）。
+
+    Returns: [(path, 是否 gzip)]
+    """
+    tags = [channel_tag(channel)]
+    if legacy_channel_tag(channel) not in tags:
+        tags.append(legacy_channel_tag(channel))
+    paths = []
+    for tag in tags:
+        for suffix in (ARCHIVE_SUFFIX, LEGACY_SUFFIX):
+            path = os.path.join(CHAT_HISTORY_DIR, f'{date_str}_channel_{tag}{suffix}')
+            if os.path.exists(path):
+                paths.append((path, suffix == ARCHIVE_SUFFIX))
+    return paths
+
+
+def _parse_archive_name(filename):
+    """解析归档文件名 → (date_str, channel)，非归档文件返回 None"""
+    for suffix in (ARCHIVE_SUFFIX, LEGACY_SUFFIX):
+        if filename.endswith(suffix):
+            stem = filename[:-len(suffix)]
+            break
+    else:
+        return None
+    date_str, sep, channel = stem.partition('_channel_')
+    if not sep or not channel:
+        return None
+    return date_str, parse_channel_tag(channel)
+
+
+def _load_gzip(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _load_plain(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_gzip(path, messages):
+    tmp_path = path + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8',
+                   compresslevel=CHAT_ARCHIVE_COMPRESSLEVEL) as f:
+        json.dump(messages, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def read_archive(date_str, channel):
+    """读取指定日期/频道的归档（压缩与旧版格式同时存在时合并），不存在返回 []"""
+    messages = []
+    for path, gz in _existing_paths(date_str, channel):
+        messages.extend(_load_gzip(path) if gz else _load_plain(path))
+    return messages
+
+
+def write_archive(date_str, channel, messages):
+    """写入压缩归档（原子替换）。同一天已有归档（含旧版文件）时追加合并。Returns: 归档路径"""
+    existing_paths = _existing_paths(date_str, channel)
+    existing = read_archive(date_str, channel)
+    if existing:
+        messages = existing + list(messages)
+
+    path = _archive_path(date_str, channel)
+    _write_gzip(path, messages)
+
+    # 已合并进压缩归档的旧版文件不再需要
+    for old_path, _ in existing_paths:
+        if old_path != path:
+            os.remove(old_path)
+    return path
+
+
+def list_archives(channel=None):
+    """列出所有归档 [(date_str, channel), ...]，按日期排序"""
+    result = set()
+    for filename in os.listdir(CHAT_HISTORY_DIR):
+        parsed = _parse_archive_name(filename)
+        if not parsed:
+            continue
+        if channel is not None and parsed[1] != channel:
+            continue
+        result.add(parsed)
+    return sorted(result, key=lambda item: (item[0], str(item[1])))
+
+
+def compress_legacy_archives():
+    """将旧版未压缩的归档转为 gzip。Returns: 转换数量"""
+    count = 0
+    for filename in os.listdir(CHAT_HISTORY_DIR):
+        if not filename.endswith(LEGACY_SUFFIX):
+            continue
+        parsed = _parse_archive_name(filename)
+        if not parsed:
+            continue
+        legacy = os.path.join(CHAT_HISTORY_DIR, filename)
+        path = _archive_path(*parsed)
+        try:
+            messages = _load_gzip(path) if os.path.exists(path) else []
+            messages.extend(_load_plain(legacy))
+            _write_gzip(path, messages)
+            os.remove(legacy)
+            count += 1
+        except Exception as e:
+            print(f"[归档压缩] 转换失败 {filename}: {e}")
+    return count
+
+
+def search_archives(keyword, channel=None):
+    """在所有归档中搜索包含关键字的消息。Returns: [(date_str, channel, msg), ...]"""
+    results = []
+    for date_str, ch in list_archives(channel):
+        for msg in read_archive(date_str, ch):
+            if keyword in msg.get('text', '') or keyword in msg.get('name', ''):
+                results.append((date_str, ch, msg))
+    return results
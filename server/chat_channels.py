@@ -0,0 +1,176 @@
+"""
+聊天频道注册表 — 按需加载、空闲回收
+
+频道标识:
+  - 1, 2                     — 公共频道（config.CHAT_PUBLIC_CHANNELS）
+  - 'game:<游戏ID>'          — 游戏频道
+  - 'room:<游戏ID>:<房间ID>' — 房间频道
+
+频道状态（内存中的当日记录）在首次订阅/写入时从日志文件懒加载，
+无订阅者且空闲超过 CHAT_CHANNEL_IDLE_SECONDS 后从内存回收。
+日志文件每次写入都会落盘，回收不丢失记录。
+"""
+
+import json
+import os
+import threading
+import time
+
+from .config import CHAT_LOG_DIR, CHAT_PUBLIC_CHANNELS
+from .chat_archive import write_archive, channel_tag, legacy_channel_tag, parse_channel_tag
+
+
+class ChatChannel:
+    """单个频道的内存状态"""
+
+    __slots__ = ('key', 'messages', 'subscribers', 'last_active')
+
+    def __init__(self, key, messages):
+        self.key = key
+        self.messages = messages
+        self.subscribers = 0
+        self.last_active = time.monotonic()
+
+
+class ChannelRegistry:
+    """聊天频道注册表"""
+
+    def __init__(self, date_str):
+        self.lock = threading.Lock()
+        self.current_date = date_str
+        self._channels = {}  # {频道标识: ChatChannel}
+
+    # ── 频道标识 ──
+
+    @staticmethod
+    def normalize(channel):
+        """规范化客户端传入的频道标识，非法返回 None"""
+        if isinstance(channel, str) and channel.isdigit():
+            channel = int(channel)
+        if isinstance(channel, int) and not isinstance(channel, bool):
+            return channel if channel in CHAT_PUBLIC_CHANNELS else None
+        if not isinstance(channel, str):
+            return None
+        parts = channel.split(':')
+        if parts[0] == 'game' and len(parts) == 2 and parts[1]:
+            return channel
+        if parts[0] == 'room' and len(parts) == 3 and parts[1] and parts[2]:
+            return channel
+        return None
+
+    @staticmethod
+    def is_public(channel):
+        return channel in CHAT_PUBLIC_CHANNELS
+
+    def log_file(self, channel, date_str=None):
+        """获取聊天记录文件路径（默认当前日期）"""
+        date_str = date_str or self.current_date
+        return os.path.join(CHAT_LOG_DIR, f'channel_{channel_tag(channel)}_{date_str}.json')
+
+    # ── 懒加载 / 订阅 ──
+
+    def _get(self, channel):
+        """获取频道状态，不在内存则从日志文件加载（需持锁调用）"""
+        ch = self._channels.get(channel)
+        if ch is None:
+            messages = []
+            log_file = self.log_file(channel)
+            if not os.path.exists(log_file):
+                # 升级前以旧版标签命名的当日日志
+                legacy = os.path.join(
+                    CHAT_LOG_DIR, f'channel_{legacy_channel_tag(channel)}_{self.current_date}.json')
+                if os.path.exists(legacy):
+                    os.replace(legacy, log_file)
+            if os.path.exists(log_file):
+                try:
+                    with open(log_file, 'r', encoding='utf-8') as f:
+                        messages = json.load(f)
+                except:
+                    messages = []
+            ch = self._channels[channel] = ChatChannel(channel, messages)
+        return ch
+
+    def subscribe(self, channel):
+        with self.lock:
+            ch = self._get(channel)
+            ch.subscribers += 1
+            ch.last_active = time.monotonic()
+
+    def unsubscribe(self, channel):
+        with self.lock:
+            ch = self._channels.get(channel)
+            if ch:
+                ch.subscribers = max(0, ch.subscribers - 1)
+                ch.last_active = time.monotonic()
+
+    def recent(self, channel, limit=50):
+        """最近的聊天记录（副本）"""
+        with self.lock:
+            ch = self._get(channel)
+            ch.last_active = time.monotonic()
+            return ch.messages[-limit:]
+
+    def append(self, channel, msg):
+        """追加一条记录并落盘（持锁保证日期切换后不再写入旧文件）"""
+        with self.lock:
+            ch = self._get(channel)
+            ch.messages.append(msg)
+            ch.last_active = time.monotonic()
+            try:
+                with open(self.log_file(channel), 'w', encoding='utf-8') as f:
+                    json.dump(ch.messages, f, ensure_ascii=False)
+            except:
+                pass
+
+    def evict_idle(self, idle_seconds):
+        """回收无订阅者且空闲超时的频道。Returns: 回收数量"""
+        deadline = time.monotonic() - idle_seconds
+        with self.lock:
+            idle = [key for key, ch in self._channels.items()
+                    if ch.subscribers == 0 and ch.last_active < deadline]
+            for key in idle:
+                del self._channels[key]
+        return len(idle)
+
+    def active_count(self):
+        return len(self._channels)
+
+    # ── 日期切换 / 归档 ──
+
+    def rollover(self, new_date):
+        """原子切换到新日期：清空内存记录，保留订阅关系。Returns: 旧日期，无需切换返回 None"""
+        with self.lock:
+            old_date = self.current_date
+            if new_date == old_date:
+                return None
+            self.current_date = new_date
+            for ch in self._channels.values():
+                ch.messages = []
+        return old_date
+
+    def archive_stale_logs(self, tag='[归档]'):
+        """归档所有非当前日期的日志文件（日志文件即完整记录）。Returns: 归档数量"""
+        count = 0
+        for filename in os.listdir(CHAT_LOG_DIR):
+            if not filename.startswith('channel_') or not filename.endswith('.json'):
+                continue
+
+            # 解析文件名: channel_<标签>_2025-12-20.json
+            stem = filename[len('channel_'):-len('.json')]
+            ch_tag, sep, file_date = stem.rpartition('_')
+            if not sep or not ch_tag or file_date == self.current_date:
+                continue
+
+            log_file = os.path.join(CHAT_LOG_DIR, filename)
+            channel = parse_channel_tag(ch_tag)
+            try:
+                with open(log_file, 'r', encoding='utf-8') as f:
+                    messages = json.load(f)
+                if messages:
+                    archive_file = write_archive(file_date, channel, messages)
+                    print(f"{tag} {file_date} 频道{channel} -> {archive_file}")
+                os.remove(log_file)
+                count += 1
+            except Exception as e:
+                print(f"{tag} 归档失败 {log_file}: {e}")
+        return count
@@ -5,14 +5,25 @@
 import socket
 import threading
 import json
-import os
 import time
 from datetime import datetime, timedelta, timezone
 
-from .config import HOST, PORT, CHAT_LOG_DIR, CHAT_HISTORY_DIR, MAINTENANCE_HOUR
+from .config import (
+    HOST, PORT, MAINTENANCE_HOUR, CHAT_CHANNEL_IDLE_SECONDS, get_command_catalog,
+    ROOM_DELTA_ENABLED, ROOM_DELTA_IDLE_SECONDS,
+)
 from .player_manager import PlayerManager
 from .lobby_engine import LobbyEngine
 from .user_schema import get_title_name, grant_title
+from .chat_archive import compress_legacy_archives
+from .chat_channels import ChannelRegistry
+from .rate_limit import FloodControl
+from .word_filter import WordFilter, ACTION_PASS, ACTION_REJECT
+from .game_protocol import SharedMessage
+from .room_delta import RoomDeltaTracker
+from .timer_wheel import get_timer_wheel
+from .bot_pool import get_bot_pool
+from .engine_host import shutdown_engine_hosts, EngineCrashed, RemoteEngineError
 
 # 北京时区
 BEIJING_TZ = timezone(timedelta(hours=8))
@@ -39,27 +50,36 @@ class ChatServer:
         self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.clients = {}
+        self.player_sockets = {}  # 已登录玩家索引 {player_name: client_socket}
         self.lock = threading.Lock()
+        self.flood_stats = {}  # 限流拒绝计数 {msg_type 或 'other': count}
+        self.word_filter = WordFilter()  # 聊天违禁词过滤
         
         # 游戏大厅引擎
         self.lobby_engine = LobbyEngine()
         # 设置邀请通知回调
         self.lobby_engine.set_invite_callback(self._send_invite_notification)
+        # 定时任务（如段位匹配成功）产生的结果经统一分发器投递
+        self.lobby_engine.set_dispatch_callback(self.dispatch_game_result)
         
-        # Bot 调度器泛化注册：从 GAME_INFO 自动创建
-        from games import GAMES
+        # Bot 调度器：首次收到该游戏的 schedule 任务时从 GAME_INFO 创建
         self.bot_schedulers = {}
-        for _gid, _mod in GAMES.items():
-            _info = getattr(_mod, 'GAME_INFO', {})
-            _create = _info.get('create_bot_scheduler')
-            if _create:
-                self.bot_schedulers[_gid] = _create(self)
+        # Bot 决策进程池：调度器通过 server.bot_pool.submit() 提交决策，结果经统一分发器投递
+        self.bot_pool = get_bot_pool()
+        self.bot_pool.set_dispatch_callback(self.dispatch_game_result)
         
         self.running = False
-        self.chat_logs = {1: [], 2: []}  # 内存中的聊天记录
-        self.current_date = get_today_date_str()  # 当前日期
+        self.channels = ChannelRegistry(get_today_date_str())  # 聊天频道（懒加载）
         self.maintenance_thread = None
+        self._catalog_version = get_command_catalog()[0]  # 已下发的指令目录版本
+        # 房间状态版本记录（room_update → 带序号的快照/增量）
+        self.room_deltas = RoomDeltaTracker() if ROOM_DELTA_ENABLED else None
         self._load_chat_logs()
+
+    @property
+    def current_date(self):
+        """当前聊天记录日期"""
+        return self.channels.current_date
     
     # ── Rich Result 通用分发器 ──
 
@@ -68,7 +88,8 @@ class ChatServer:
         'game', 'room_update', 'location_update', 'room_leave', 'game_quit',
         'status', 'online_users', 'chat', 'system', 'action',
         'login_prompt', 'login_success', 'request_avatar', 'chat_history',
-        'game_invite', 'game_event',
+        'game_invite', 'game_event', 'command_catalog', 'room_delta',
+        'spectate_update',
     })
 
     def _wrap_game_event(self, msg, game_type):
@@ -98,6 +119,8 @@ class ChatServer:
         """通用游戏结果分发器 — Rich Result Protocol。
 
         游戏引擎返回 send_to_caller / send_to_players / schedule / save，
+        schedule 任务带 delay（秒）时经共享定时轮延时交给 Bot 调度器，
+        cancel_schedule: [{'game_id', 'room_id'}, ...] 取消这些房间尚未执行的延时任务。
         本方法只做无脑投递，不解读游戏内容。
         游戏特有消息类型自动包装为 game_event 信封。
         """
@@ -106,17 +129,21 @@ class ChatServer:
 
         # 1. send_to_caller
         if caller_socket:
+            caller_info = self.clients.get(caller_socket)
             for msg in result.get('send_to_caller', []):
-                msg = self._wrap_game_event(msg, game_type)
-                self._inject_location_path(msg)
-                self.send_to(caller_socket, msg)
+                msg = self._prepare_message(msg, game_type)
+                self.send_to(caller_socket, self._room_state_message(caller_info, msg))
 
-        # 2. send_to_players
+        # 2. send_to_players（SharedMessage 只包装/编码一次，所有接收者复用）
         for target, messages in result.get('send_to_players', {}).items():
             for msg in messages:
-                msg = self._wrap_game_event(msg, game_type)
-                self._inject_location_path(msg)
-                self.send_to_player(target, msg)
+                self.send_to_player(target, self._prepare_message(msg, game_type))
+
+        # 2b. send_to_group — 多人相同消息（如旁观推送），每条只编码一次
+        group = result.get('send_to_group')
+        if group:
+            for msg in group.get('messages', []):
+                self.send_to_many(group.get('players', ()), self._prepare_message(msg, game_type))
 
         # 3. 位置变更：自动向 caller 发送 location_update / room_leave
         if caller_socket and caller_name and action in ('location_update', 'back_to_game'):
@@ -126,12 +153,21 @@ class ChatServer:
             self._inject_location_path(loc_msg)
             self.send_to(caller_socket, loc_msg)
 
-        # 4. schedule
+        # 4. schedule — 带 delay 的任务由共享定时轮延时投递（按房间可取消）
+        wheel = get_timer_wheel()
+        for target in result.get('cancel_schedule', []):
+            wheel.cancel_key((target.get('game_id', ''), target.get('room_id')))
         for task in result.get('schedule', []):
             gid = task.get('game_id', '')
-            sched = self.bot_schedulers.get(gid)
+            sched = self._get_bot_scheduler(gid)
             if sched and hasattr(sched, 'handle_schedule'):
-                sched.handle_schedule(task)
+                delay = task.get('delay')
+                if delay:
+                    task = {k: v for k, v in task.items() if k != 'delay'}
+                    wheel.schedule(delay, sched.handle_schedule, task,
+                                   key=(gid, task.get('room_id')))
+                else:
+                    sched.handle_schedule(task)
 
         # 5. save / status
         if caller_name and caller_data:
@@ -139,23 +175,119 @@ class ChatServer:
             if caller_socket:
                 self.send_player_status(caller_socket, caller_data)
 
+    def _prepare_message(self, msg, game_type):
+        """投递前的 game_event 包装与路径注入（SharedMessage 只处理一次）"""
+        if isinstance(msg, SharedMessage):
+            if not msg.prepared:
+                msg.payload = self._wrap_game_event(msg.payload, game_type)
+                self._inject_location_path(msg.payload)
+                msg.prepared = True
+            return msg
+        msg = self._wrap_game_event(msg, game_type)
+        self._inject_location_path(msg)
+        return msg
+
+    def _get_bot_scheduler(self, game_id):
+        """获取游戏的 Bot 调度器（按需创建）"""
+        sched = self.bot_schedulers.get(game_id)
+        if sched is None and game_id:
+            from games import get_game
+            module = get_game(game_id)
+            create = getattr(module, 'GAME_INFO', {}).get('create_bot_scheduler') if module else None
+            if create:
+                # 锁外创建（create 可能回调服务器并取 self.lock），并发创建时保留先放入的
+                new = create(self)
+                with self.lock:
+                    sched = self.bot_schedulers.setdefault(game_id, new)
+        return sched
+
     def _inject_location_path(self, msg):
-        """为 location_update/room_leave 消息注入面包屑路径和指令列表"""
+        """为 location_update/room_leave 消息注入面包屑路径和指令目录版本
+
+        指令列表不再随消息下发：客户端用登录时收到的指令目录按
+        location 取用，commands_version 与本地目录不一致时等待新目录。
+        """
         if isinstance(msg, dict) and msg.get('type') in ('location_update', 'room_leave'):
             loc = msg.get('location')
             if loc:
                 if 'location_path' not in msg:
                     msg['location_path'] = self.lobby_engine.get_location_path(loc)
                 if 'commands' not in msg:
-                    msg['commands'] = self.lobby_engine.get_commands_for_location(loc)
+                    msg['commands_version'] = self._sync_command_catalog()
+
+    def _sync_command_catalog(self):
+        """返回当前指令目录版本；目录变更时向所有在线玩家重发"""
+        version, catalog = get_command_catalog()
+        if version != self._catalog_version:
+            self._catalog_version = version
+            with self.lock:
+                targets = [c for c, info in self.clients.items() if info.get('state') == 'playing']
+            for client in targets:
+                self._send_command_catalog(client)
+        return version
+
+    def _send_command_catalog(self, client_socket):
+        """下发完整指令目录（登录时 / 目录变更时）"""
+        version, catalog = get_command_catalog()
+        self.send_to(client_socket, {
+            'type': 'command_catalog', 'version': version, 'catalog': catalog})
 
     def send_to_player(self, player_name, data):
         """发送消息给指定玩家（Bot调度器回调接口）"""
         with self.lock:
-            for client, info in self.clients.items():
-                if info.get('name') == player_name:
-                    self.send_to(client, data)
-                    break
+            client = self.player_sockets.get(player_name)
+            info = self.clients.get(client) if client else None
+            if info:
+                self.send_to(client, self._room_state_message(info, data))
+
+    def send_to_many(self, player_names, data):
+        """同一条消息发给多名玩家：只编码一次"""
+        if not isinstance(data, SharedMessage):
+            data = SharedMessage(data)
+        with self.lock:
+            sockets = [self.player_sockets.get(name) for name in player_names]
+        for client in sockets:
+            if client:
+                self.send_to(client, data)
+
+    def _index_player(self, client_socket, name):
+        """登记已登录玩家的 socket（需持锁调用）"""
+        self.player_sockets[name] = client_socket
+
+    def _room_state_message(self, client_info, msg):
+        """room_update → 该客户端应收到的带序号快照或增量（见 room_delta）
+
+        房间 id 取消息的 room_id 或 room_data['room_id']，都没有时原样发送。
+        """
+        if self.room_deltas is None or not client_info:
+            return msg
+        payload = msg.payload if isinstance(msg, SharedMessage) else msg
+        if not isinstance(payload, dict) or payload.get('type') != 'room_update':
+            return msg
+        room_data = payload.get('room_data')
+        if not isinstance(room_data, dict):
+            return msg
+        room_id = payload.get('room_id', room_data.get('room_id'))
+        if room_id is None:
+            return msg
+
+        key = (self._resolve_game_type(client_info.get('name')), room_id)
+        seen = client_info.setdefault('room_seq', {})
+        out, seen[key] = self.room_deltas.message_for(key, payload, seen.get(key))
+        return out
+
+    def _handle_room_resync(self, client_socket, client_info, msg):
+        """客户端发现序号断档，重发完整快照（仅限收到过该房间消息的客户端）"""
+        if self.room_deltas is None:
+            return
+        key = (msg.get('game', ''), msg.get('room_id'))
+        seen = client_info.get('room_seq', {})
+        if key not in seen:
+            return
+        found = self.room_deltas.resync(key)
+        if found:
+            full, seen[key] = found
+            self.send_to(client_socket, full)
 
     def _send_invite_notification(self, target_name, invite_data):
         """发送邀请通知给指定玩家"""
@@ -165,73 +297,15 @@ class ChatServer:
                     self.send_to(client, invite_data)
                     break
 
-    def _get_log_file(self, channel):
-        """获取当前日期的聊天记录文件路径"""
-        return os.path.join(CHAT_LOG_DIR, f'channel_{channel}_{self.current_date}.json')
-
-    def _check_and_archive_old_logs(self):
-        """启动时检查并归档过期的聊天记录"""
-        today = get_today_date_str()
-        
-        # 扫描 chat_logs 目录下的所有日志文件
-        for filename in os.listdir(CHAT_LOG_DIR):
-            if not filename.startswith('channel_') or not filename.endswith('.json'):
-                continue
-            
-            # 解析文件名: channel_1_2025-12-20.json
-            parts = filename.replace('.json', '').split('_')
-            if len(parts) != 3:
-                continue
-            
-            try:
-                file_date = parts[2]  # 2025-12-20
-                # 如果文件日期不是今天，需要归档
-                if file_date != today:
-                    channel = int(parts[1])
-                    self._archive_old_log_file(channel, file_date)
-            except:
-                continue
-
-    def _archive_old_log_file(self, channel, file_date):
-        """归档指定日期的聊天记录"""
-        log_file = os.path.join(CHAT_LOG_DIR, f'channel_{channel}_{file_date}.json')
-        
-        if not os.path.exists(log_file):
-            return
-        
-        try:
-            with open(log_file, 'r', encoding='utf-8') as f:
-                messages = json.load(f)
-            
-            if messages:
-                # 归档到 history 文件夹
-                archive_file = os.path.join(CHAT_HISTORY_DIR, f'{file_date}_channel_{channel}.json')
-                with open(archive_file, 'w', encoding='utf-8') as f:
-                    json.dump(messages, f, ensure_ascii=False, indent=2)
-                print(f"[启动归档] {file_date} 频道{channel} -> {archive_file}")
-            
-            # 删除旧的日志文件
-            os.remove(log_file)
-        except Exception as e:
-            print(f"[启动归档] 归档失败 {log_file}: {e}")
-
     def _load_chat_logs(self):
-        """加载当天的聊天记录"""
-        # 先检查并归档过期的记录
-        self._check_and_archive_old_logs()
-        
-        self.current_date = get_today_date_str()
-        for channel in [1, 2]:
-            log_file = self._get_log_file(channel)
-            if os.path.exists(log_file):
-                try:
-                    with open(log_file, 'r', encoding='utf-8') as f:
-                        self.chat_logs[channel] = json.load(f)
-                except:
-                    self.chat_logs[channel] = []
-            else:
-                self.chat_logs[channel] = []
-        print(f"[聊天记录] 已加载 {self.current_date} 的记录")
+        """启动时归档过期的聊天记录（当天记录在频道首次使用时懒加载）"""
+        # 旧版未压缩归档统一转为 gzip
+        converted = compress_legacy_archives()
+        if converted:
+            print(f"[启动归档] 已压缩 {converted} 个旧版归档文件")
+
+        self.channels.archive_stale_logs('[启动归档]')
+        print(f"[聊天记录] 当前日期 {self.current_date}")
 
     def _check_and_grant_time_titles(self, player_data):
         """检查并授予时间相关头衔"""
@@ -282,100 +356,49 @@ class ChatServer:
             'text': text, 
             'time': now.strftime('%H:%M:%S')
         }
-        self.chat_logs[channel].append(msg)
-        
-        # 写入文件
-        log_file = self._get_log_file(channel)
-        try:
-            with open(log_file, 'w', encoding='utf-8') as f:
-                json.dump(self.chat_logs[channel], f, ensure_ascii=False)
-        except:
-            pass
+        self.channels.append(channel, msg)
 
-    def _archive_chat_logs(self):
-        """归档聊天记录到历史文件夹"""
-        yesterday = self.current_date
-        print(f"[维护] 正在归档 {yesterday} 的聊天记录...")
-        
-        for channel in [1, 2]:
-            log_file = self._get_log_file(channel)
-            if os.path.exists(log_file) and self.chat_logs[channel]:
-                # 归档到 history 文件夹
-                archive_file = os.path.join(CHAT_HISTORY_DIR, f'{yesterday}_channel_{channel}.json')
-                try:
-                    with open(archive_file, 'w', encoding='utf-8') as f:
-                        json.dump(self.chat_logs[channel], f, ensure_ascii=False, indent=2)
-                    print(f"[维护] 频道{channel}归档完成: {archive_file}")
-                except Exception as e:
-                    print(f"[维护] 频道{channel}归档失败: {e}")
-                
-                # 删除旧的日志文件
-                try:
-                    os.remove(log_file)
-                except:
-                    pass
-        
-        # 清空内存中的记录
-        self.chat_logs = {1: [], 2: []}
-        # 更新日期
-        self.current_date = get_today_date_str()
-        print(f"[维护] 归档完成，新的一天开始: {self.current_date}")
+    def _archive_chat_logs(self, date_str):
+        """归档指定日期的聊天记录到历史文件夹（后台线程执行）"""
+        print(f"[维护] 正在归档 {date_str} 的聊天记录...")
+        self.channels.archive_stale_logs('[维护]')
+        print(f"[维护] {date_str} 归档完成")
 
     def _maintenance_loop(self):
         """维护检查循环"""
         while self.running:
-            now = get_beijing_now()
-            
-            # 检查是否到了维护时间（凌晨4点）
-            if now.hour == MAINTENANCE_HOUR and now.minute == 0:
-                today = get_today_date_str()
-                if today != self.current_date:
-                    self._do_maintenance()
-                    # 等待1分钟避免重复触发
-                    time.sleep(60)
-            
+            # 日期切换（凌晨4点为分界）时在线滚动聊天记录
+            if get_today_date_str() != self.current_date:
+                self._do_maintenance()
+
+            # 违禁词表热加载
+            self.word_filter.reload_if_changed()
+
+            # 回收空闲频道 / 空闲引擎
+            self.channels.evict_idle(CHAT_CHANNEL_IDLE_SECONDS)
+            self.lobby_engine.engine_pool.sweep()
+            if self.room_deltas:
+                self.room_deltas.evict_idle(ROOM_DELTA_IDLE_SECONDS)
+
             time.sleep(30)  # 每30秒检查一次
 
     def _do_maintenance(self):
-        """执行维护"""
-        print("[维护] 系统维护开始...")
-        
-        # 通知所有玩家
-        self.broadcast({
-            'type': 'system',
-            'text': '⚠ 系统维护时间到，请在1分钟内保存数据并退出，服务器即将重置聊天记录...'
-        })
-        
-        # 等待30秒
-        time.sleep(30)
-        
-        # 再次通知
+        """执行维护：原子切换到新日期的日志，旧日志后台归档，不断开任何玩家"""
+        new_date = get_today_date_str()
+        old_date = self.channels.rollover(new_date)
+        if not old_date:
+            return
+
+        print(f"[维护] 新的一天开始: {new_date}，后台归档 {old_date} 的聊天记录")
+        archive_thread = threading.Thread(
+            target=self._archive_chat_logs, args=(old_date,))
+        archive_thread.daemon = True
+        archive_thread.start()
+
         self.broadcast({
             'type': 'system',
-            'text': '⚠ 系统维护中，正在归档聊天记录...'
+            'text': f'新的一天开始了，{old_date} 的聊天记录已转入归档。'
         })
-        
-        # 断开所有客户端
-        with self.lock:
-            clients_to_close = list(self.clients.keys())
-        
-        for client in clients_to_close:
-            try:
-                self.send_to(client, {'type': 'action', 'action': 'maintenance'})
-            except:
-                pass
-        
-        # 等待客户端断开
-        time.sleep(5)
-        
-        # 强制断开
-        for client in clients_to_close:
-            self.remove_client(client)
-        
-        # 归档聊天记录
-        self._archive_chat_logs()
-        
-        print("[维护] 系统维护完成，服务器继续运行")
 
     def get_local_ip(self):
         try:
@@ -406,8 +429,11 @@ class ChatServer:
 
     def send_to(self, client_socket, message):
         try:
-            data = json.dumps(message) + '\n'
-            client_socket.send(data.encode('utf-8'))
+            if isinstance(message, SharedMessage):
+                data = message.encode()
+            else:
+                data = (json.dumps(message) + '\n').encode('utf-8')
+            client_socket.send(data)
         except:
             pass
 
@@ -427,8 +453,10 @@ class ChatServer:
         
         with self.lock:
             self.clients[client_socket] = {
-                'name': None, 'state': 'login', 'data': None, 'channel': 1
+                'name': None, 'state': 'login', 'data': None, 'channel': 1,
+                'limiter': FloodControl(),
             }
+        self.channels.subscribe(1)
         
         # 登录提示发到指令区
         self.send_to(client_socket, {'type': 'login_prompt', 'text': '请输入用户名：'})
@@ -459,17 +487,36 @@ class ChatServer:
         
         state = client_info['state']
         msg_type = msg.get('type', 'command')
+
+        # 限流：分发前检查连接总配额与消息类型配额
+        limiter = client_info['limiter']
+        if not limiter.allow(msg_type):
+            self._reject_flood(client_socket, client_info, msg_type)
+            return
+
         text = msg.get('text', '').strip()
         
         if msg_type == 'switch_channel':
-            channel = msg.get('channel', 1)
+            channel = self.channels.normalize(msg.get('channel', 1))
+            if channel is None or not self._can_join_channel(client_info, channel):
+                self.send_to(client_socket, {'type': 'system', 'text': '无法进入该频道。'})
+                return
             with self.lock:
+                old_channel = self.clients[client_socket]['channel']
                 self.clients[client_socket]['channel'] = channel
+            if old_channel != channel:
+                self.channels.unsubscribe(old_channel)
+                self.channels.subscribe(channel)
             # 发送该频道的聊天历史
             self._send_chat_history(client_socket, channel)
             self.broadcast_online_users()
             return
         
+        if msg_type == 'room_resync':
+            if state == 'playing':
+                self._handle_room_resync(client_socket, client_info, msg)
+            return
+
         if msg_type == 'avatar_update':
             avatar_data = msg.get('avatar') or None
             if state == 'register':
@@ -498,11 +545,59 @@ class ChatServer:
         elif state == 'playing':
             self._handle_playing(client_socket, msg)
 
+    def _reject_flood(self, client_socket, client_info, msg_type):
+        """处理被限流的消息：计数 + 节流提示"""
+        limiter = client_info['limiter']
+        key = limiter.stat_key(msg_type)
+        with self.lock:
+            self.flood_stats[key] = self.flood_stats.get(key, 0) + 1
+        total = limiter.total_rejected()
+        if total == 1 or total % 100 == 0:
+            print(f"[限流] {client_info.get('name') or '未登录连接'} {key} 已拒绝 {total} 条")
+        if limiter.should_notify():
+            self.send_to(client_socket, {'type': 'system', 'text': '操作过于频繁，请稍后再试。'})
+
+    def _can_join_channel(self, client_info, channel):
+        """检查客户端能否进入频道（游戏频道需游戏已注册，房间频道需身在该房间）"""
+        if self.channels.is_public(channel):
+            return True
+        if client_info.get('state') != 'playing':
+            return False
+        from games import GAMES
+        parts = channel.split(':')
+        if parts[1] not in GAMES:
+            return False
+        if parts[0] == 'game':
+            return True
+        name = client_info.get('name')
+        engine = self.lobby_engine._get_engine(parts[1], name)
+        if not engine or not hasattr(engine, 'get_player_room'):
+            return False
+        room = engine.get_player_room(name)
+        return bool(room) and str(getattr(room, 'room_id', '')) == parts[2]
+
+    def _leave_stale_room_channel(self, client_socket, client_info):
+        """已离开房间的玩家退出该房间频道，回到公共频道 1。Returns: 是否退出"""
+        channel = client_info.get('channel', 1)
+        if not (isinstance(channel, str) and channel.startswith('room:')):
+            return False
+        if self._can_join_channel(client_info, channel):
+            return False
+        with self.lock:
+            if client_info.get('channel') != channel:
+                return False
+            client_info['channel'] = 1
+        self.channels.unsubscribe(channel)
+        self.channels.subscribe(1)
+        self.send_to(client_socket, {'type': 'system', 'text': '已离开房间，自动返回公共频道。'})
+        self._send_chat_history(client_socket, 1)
+        self.broadcast_online_users()
+        return True
+
     def _send_chat_history(self, client_socket, channel):
         """发送聊天历史"""
-        messages = self.chat_logs.get(channel, [])
         # 发送最近50条
-        recent = messages[-50:] if len(messages) > 50 else messages
+        recent = self.channels.recent(channel, 50)
         self.send_to(client_socket, {
             'type': 'chat_history',
             'channel': channel,
@@ -590,6 +685,7 @@ class ChatServer:
         with self.lock:
             self.clients[client_socket]['state'] = 'playing'
             self.clients[client_socket]['data'] = player_data
+            self._index_player(client_socket, name)
             if 'temp_password' in self.clients[client_socket]:
                 del self.clients[client_socket]['temp_password']
         
@@ -599,7 +695,8 @@ class ChatServer:
         # 注册到游戏大厅引擎（用于邀请功能）
         self.lobby_engine.register_player(name, player_data)
         
-        # 下发初始位置指令集
+        # 下发指令目录与初始位置
+        self._send_command_catalog(client_socket)
         self._send_initial_location(client_socket, name)
         
         # 发送聊天历史
@@ -658,6 +755,7 @@ class ChatServer:
             with self.lock:
                 self.clients[client_socket]['state'] = 'playing'
                 self.clients[client_socket]['data'] = player_data
+                self._index_player(client_socket, name)
             
             self.send_to(client_socket, {'type': 'login_success', 'text': f'登录成功！'})
             self.send_player_status(client_socket, player_data)
@@ -665,7 +763,8 @@ class ChatServer:
             # 注册到游戏大厅引擎（用于邀请功能）
             self.lobby_engine.register_player(name, player_data)
             
-            # 下发初始位置指令集
+            # 下发指令目录与初始位置
+            self._send_command_catalog(client_socket)
             self._send_initial_location(client_socket, name)
             
             # 发送聊天历史
@@ -709,7 +808,11 @@ class ChatServer:
         for evt in result.get('game_events', []):
             self.send_to(client_socket, evt)
         if 'room_data' in result:
-            self.send_to(client_socket, {'type': 'room_update', 'room_data': result['room_data']})
+            room_msg = {'type': 'room_update', 'room_data': result['room_data']}
+            if 'room_id' in result:
+                room_msg['room_id'] = result['room_id']
+            # 与分发器一致走增量协议，保持客户端 seq 与快照基线同步
+            self.send_to(client_socket, self._room_state_message(self.clients.get(client_socket), room_msg))
         if action == 'back_to_game':
             loc, path = self._resolve_location(name, result)
             loc_msg = {'type': 'room_leave', 'location': loc, 'location_path': path}
@@ -746,7 +849,11 @@ class ChatServer:
             elif action == 'rename_success':
                 old_name = result.get('old_name')
                 new_name = result.get('new_name')
-                self.clients[client_socket]['name'] = new_name
+                with self.lock:
+                    self.clients[client_socket]['name'] = new_name
+                    if self.player_sockets.get(old_name) is client_socket:
+                        del self.player_sockets[old_name]
+                    self._index_player(client_socket, new_name)
                 self.send_to(client_socket, {'type': 'game', 'text': result.get('message', '')})
                 PlayerManager.save_player_data(new_name, player_data)
                 self.send_player_status(client_socket, player_data)
@@ -793,6 +900,10 @@ class ChatServer:
                     self.send_to(client_socket, {'type': 'game', 'text': f'[服务器错误] {e}'})
             else:
                 self.send_to(client_socket, {'type': 'game', 'text': '未知指令。'})
+            # 指令可能让玩家离开了房间（离开/解散/被踢时下次发言前再检查）
+            client_info = self.clients.get(client_socket)
+            if client_info:
+                self._leave_stale_room_channel(client_socket, client_info)
         
         elif msg_type == 'save_layout':
             layout = msg.get('layout')
@@ -802,8 +913,23 @@ class ChatServer:
                     PlayerManager.save_player_data(name, player_data)
 
         elif msg_type == 'chat':
-            channel = msg.get('channel', 1)
+            client_info = self.clients.get(client_socket)
+            if client_info and self._leave_stale_room_channel(client_socket, client_info):
+                client_channel = 1
+            channel = self.channels.normalize(msg.get('channel', 1))
+            if channel is None or not (self.channels.is_public(channel) or channel == client_channel):
+                self.send_to(client_socket, {'type': 'system', 'text': '请先进入该频道再发言。'})
+                return
             display_name = f"[Lv.{player_data['level']}]{name}"
+
+            # 违禁词过滤（单次扫描）
+            filtered = self.word_filter.check(text)
+            if filtered.action != ACTION_PASS:
+                print(f"[违禁词][CH{channel}][{name}] {filtered.words} -> {text}")
+                if filtered.action == ACTION_REJECT:
+                    self.send_to(client_socket, {'type': 'system', 'text': '消息包含违禁内容，未发送。'})
+                    return
+                text = filtered.text
             
             # 记录聊天统计并检查头衔
             self._track_chat_message(name, player_data)
@@ -851,11 +977,21 @@ class ChatServer:
             if game_id:
                 engine = self.lobby_engine._get_engine(game_id, player_name)
                 if engine and hasattr(engine, 'get_status_extras'):
-                    extras = engine.get_status_extras(player_name, player_data) or {}
+                    try:
+                        extras = engine.get_status_extras(player_name, player_data) or {}
+                    except (EngineCrashed, RemoteEngineError) as e:
+                        print(f"[状态] {game_id} 附加状态获取失败: {e}")
             
             status_msg = {'type': 'status', 'data': status_data}
             status_msg['location'] = location
-            status_msg['location_path'] = self.lobby_engine.get_location_path(location, player_name)
+            # 面包屑未变化时不重复下发
+            location_path = self.lobby_engine.get_location_path(location, player_name)
+            with self.lock:
+                client_info = self.clients.get(client_socket)
+            if client_info is None or client_info.get('last_location_path') != location_path:
+                status_msg['location_path'] = location_path
+                if client_info is not None:
+                    client_info['last_location_path'] = location_path
             status_msg.update(extras)
             self.send_to(client_socket, status_msg)
         except:
@@ -870,11 +1006,14 @@ class ChatServer:
             if client_socket in self.clients:
                 info = self.clients[client_socket]
                 name = info.get('name')
+                self.channels.unsubscribe(info.get('channel', 1))
                 
                 if info.get('data'):
                     PlayerManager.save_player_data(name, info['data'])
                 
                 del self.clients[client_socket]
+                if name and self.player_sockets.get(name) is client_socket:
+                    del self.player_sockets[name]
                 
                 try:
                     client_socket.close()
@@ -884,11 +1023,12 @@ class ChatServer:
                 if name and info.get('state') == 'playing':
                     print(f"[-] {name} 离开")
                     should_broadcast = True
-                    
-                    # 从游戏引擎中注销玩家（处理判负、段位）并获取通知列表
-                    room_notifications = self.lobby_engine.unregister_player(name)
         
         if should_broadcast:
+            # 从游戏引擎中注销玩家（处理判负、段位）并获取通知列表
+            # 在全局锁外调用：隔离引擎的断线处理是一次进程间调用
+            room_notifications = self.lobby_engine.unregister_player(name)
+            
             # 聊天室显示下线消息
             offline_msg = f'{name} 下线了'
             self._save_chat_log(1, '[SYS]', offline_msg)
@@ -904,8 +1044,9 @@ class ChatServer:
         self.server.bind((HOST, PORT))
         self.server.listen(10)
         
-        # 启动时升级所有用户数据到最新模板
+        # 启动时先重放未完成的段位结算，再升级所有用户数据到最新模板
         from .player_manager import PlayerManager
+        PlayerManager.recover_settlements()
         total, updated = PlayerManager.upgrade_all_users()
         if total > 0:
             print(f"[用户数据检查] 共 {total} 个用户，已更新 {updated} 个")
@@ -935,3 +1076,5 @@ class ChatServer:
     def stop(self):
         self.running = False
         self.server.close()
+        self.bot_pool.shutdown()
+        shutdown_engine_hosts()
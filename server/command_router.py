@@ -0,0 +1,69 @@
+"""
+指令路由表 — 按作用域注册的声明式指令分发
+
+作用域解析顺序（每级一次字典查找）:
+  1. '*'         — 全局指令（任何位置有效）
+  2. <location>  — 位置专属指令（如 profile）
+  3. '@game'     — 游戏位置内的框架指令（/back /home 交给引擎）
+     '@default'  — 非游戏位置的兜底指令（/back /home 返回上级）
+
+未命中的游戏位置指令由 LobbyEngine 直接交给对应引擎的 handle_command。
+"""
+
+GLOBAL_SCOPE = '*'
+GAME_SCOPE = '@game'
+DEFAULT_SCOPE = '@default'
+
+
+def _normalize(name):
+    return name if name.startswith('/') else '/' + name
+
+
+class CommandRouter:
+    """指令路由表
+
+    handler 签名: handler(player_name, player_data, args, location) -> result
+    返回 None 表示未处理，继续后续路由。
+    """
+
+    def __init__(self):
+        self._scopes = {}  # {scope: {'/cmd': handler}}
+        self._global = self._scopes.setdefault(GLOBAL_SCOPE, {})
+
+    def register(self, name, handler, scope=GLOBAL_SCOPE):
+        """注册指令（同名覆盖）"""
+        self._scopes.setdefault(scope, {})[_normalize(name)] = handler
+
+    def unregister(self, name, scope=GLOBAL_SCOPE):
+        self._scopes.get(scope, {}).pop(_normalize(name), None)
+
+    def bind_table(self, table, handlers, scopes=None):
+        """按指令表（commands.json 格式）绑定 handlers 中的同名处理函数
+
+        Returns: 表中没有对应处理函数的 [(scope, name), ...]
+        """
+        unbound = []
+        for scope, entries in table.items():
+            if scopes is not None and scope not in scopes:
+                continue
+            for entry in entries:
+                name = entry.get('name', '')
+                handler = handlers.get(name)
+                if handler:
+                    self.register(name, handler, scope)
+                else:
+                    unbound.append((scope, name))
+        return unbound
+
+    def resolve(self, cmd, location, in_game):
+        """解析指令处理函数，未注册返回 None"""
+        handler = self._global.get(cmd)
+        if handler is None:
+            scoped = self._scopes.get(location)
+            if scoped:
+                handler = scoped.get(cmd)
+            if handler is None:
+                fallback = self._scopes.get(GAME_SCOPE if in_game else DEFAULT_SCOPE)
+                if fallback:
+                    handler = fallback.get(cmd)
+        return handler
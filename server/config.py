@@ -28,6 +28,79 @@ DATA_DIR = os.path.join(BASE_DIR, 'data')
 USERS_DIR = os.path.join(DATA_DIR, 'users')
 CHAT_LOG_DIR = os.path.join(DATA_DIR, 'chat_logs')
 CHAT_HISTORY_DIR = os.path.join(CHAT_LOG_DIR, 'history')
+ENGINE_POOL_DIR = os.path.join(DATA_DIR, 'engine_pool')
+SETTLEMENTS_DIR = os.path.join(DATA_DIR, 'settlements')  # 段位结算事务日志
+LEADERBOARD_DIR = os.path.join(DATA_DIR, 'leaderboards')  # 各游戏段位排行榜
+
+# 聊天归档 gzip 压缩级别（1-9）
+CHAT_ARCHIVE_COMPRESSLEVEL = 9
+
+# 公共聊天频道（游戏/房间频道按需创建）
+CHAT_PUBLIC_CHANNELS = (1, 2)
+# 无订阅者的频道空闲多久后从内存回收（秒）
+CHAT_CHANNEL_IDLE_SECONDS = 600
+
+# 聊天违禁词表（reject / mask / log 三组，修改后自动热加载）
+BANNED_WORDS_FILE = os.path.join(os.path.dirname(__file__), 'banned_words.json')
+
+# per_player 引擎池
+ENGINE_POOL_MAX_ENGINES = 500            # 池内引擎数量上限
+ENGINE_POOL_IDLE_SECONDS = 1800          # 空闲多久后回收（秒）
+ENGINE_POOL_MEMORY_BUDGET = 256 * 1024 * 1024  # 内存预算（字节），0 为不限
+ENGINE_POOL_DEFAULT_ENGINE_BYTES = 256 * 1024  # 引擎未提供 get_memory_usage() 时的估算值
+
+# 引擎隔离：这些游戏（或 GAME_INFO['isolated'] 为 True 的游戏）的引擎运行在独立工作进程中
+ISOLATED_GAMES = set()
+ENGINE_HOST_TIMEOUT = 10.0  # 单次引擎调用超时（秒），超时视为卡死并重启工作进程
+
+# 定时轮（统一延时调度：过期、Bot 回合、延时动作）
+TIMER_WHEEL_TICK = 0.05     # 第 0 层每格时长（秒）
+TIMER_WHEEL_SLOTS = 256     # 每层槽位数
+TIMER_WHEEL_LEVELS = 3      # 层数（最长延时 = TICK * SLOTS ** LEVELS ≈ 9.7 天）
+TIMER_WHEEL_WORKERS = 4     # 执行回调的工作线程数
+
+# Bot 决策进程池（CPU 密集的 AI 计算移出大厅进程；关闭时在调用线程内直接计算）
+BOT_POOL_ENABLED = False
+BOT_POOL_WORKERS = 2
+
+# 待确认状态 / 游戏邀请的过期时间（秒）
+PENDING_CONFIRM_TTL = 120
+INVITE_TTL = 300
+
+# 房间列表每页房间数
+ROOM_LIST_PAGE_SIZE = 10
+
+# 段位匹配（窗口单位为段位序号）
+MATCH_BASE_WINDOW = 1       # 初始可匹配的段位差
+MATCH_WIDEN_SECONDS = 15    # 每等待多少秒窗口 +1
+MATCH_MAX_WINDOW = 6        # 窗口上限
+MATCHMAKING_TICK = 2.0      # 匹配检查间隔（秒）
+
+# 房间状态增量协议（room_delta / room_resync），关闭后始终发送完整 room_update
+ROOM_DELTA_ENABLED = True
+ROOM_DELTA_IDLE_SECONDS = 1800  # 房间多久没有更新后回收版本记录（秒）
+
+# 旁观：同一房间的更新合并后每隔 SPECTATOR_BATCH_DELAY 秒推送一次公开视图
+SPECTATOR_BATCH_DELAY = 1.0
+SPECTATOR_MAX_PER_ROOM = 200
+
+# 赛季结算（离线工具 python -m server.season）
+SEASON_RESET_DROP = 3       # 软重置下降段位数
+SEASON_INACTIVE_DROP = 1    # 本赛季未打段位场额外下降段位数
+SEASON_POINTS_KEEP = 0.5    # 未掉段时保留的段位点比例
+SEASON_TIER_GOLD = {2: 100, 3: 200, 4: 400, 5: 800, 6: 1600}  # 赛季末 tier → 奖励金币
+
+# 每连接消息限流（令牌桶）
+# 格式: {消息类型: (每秒补充令牌数, 桶容量)}，"*" 为连接总限额
+RATE_LIMITS = {
+    '*':             (10, 30),
+    'command':       (5, 15),
+    'chat':          (1, 5),
+    'switch_channel': (1, 5),
+    'save_layout':   (0.2, 3),
+    'avatar_update': (0.1, 2),
+    'room_resync':   (1, 5),
+}
 
 # 系统维护时间（北京时间凌晨4点）
 MAINTENANCE_HOUR = 4
@@ -45,6 +118,7 @@ def register_game_locations(game_info: dict) -> None:
     locations = game_info.get('locations', {})
     for loc_id, (display_name, parent) in locations.items():
         LOCATION_HIERARCHY[loc_id] = (display_name, parent)
+    invalidate_location_cache()
 
 
 # ── 指令表（从 commands.json 加载）──
@@ -61,7 +135,76 @@ def _load_command_table() -> dict[str, list[dict]]:
 COMMAND_TABLE: dict[str, list[dict]] = _load_command_table()
 
 
+# ── 位置缓存（面包屑 / 指令列表，注册游戏时失效）──
+
+_breadcrumb_cache: dict[str, tuple] = {}
+_location_commands_cache: dict[str, list[dict]] = {}
+_command_catalog: tuple | None = None
+
+
+def invalidate_location_cache() -> None:
+    """清空位置缓存（LOCATION_HIERARCHY / COMMAND_TABLE 变更后调用）"""
+    global _command_catalog
+    _breadcrumb_cache.clear()
+    _location_commands_cache.clear()
+    _command_catalog = None
+
+
+def get_location_breadcrumb(location: str) -> tuple:
+    """位置的面包屑。Returns: (名称元组, 房间层级下标或 -1, 拼接好的路径)"""
+    cached = _breadcrumb_cache.get(location)
+    if cached is not None:
+        return cached
+    path = []
+    path_keys = []
+    current = location
+    while current:
+        info = LOCATION_HIERARCHY.get(current)
+        if info:
+            path.append(info[0])
+            path_keys.append(current)
+            current = info[1]
+        else:
+            path.append(current)
+            path_keys.append(current)
+            break
+    path.reverse()
+    path_keys.reverse()
+    room_idx = next((i for i, key in enumerate(path_keys) if '_room' in key), -1)
+    joined = ' > '.join(path) if path else '游戏大厅'
+    cached = (tuple(path), room_idx, joined)
+    _breadcrumb_cache[location] = cached
+    return cached
+
+
+def get_command_catalog() -> tuple[str, dict[str, list[dict]]]:
+    """完整指令目录及其内容哈希。Returns: (version, COMMAND_TABLE)
+
+    客户端登录时缓存整个目录，之后位置消息只携带 location + version，
+    客户端自行拼出 catalog['*'] + catalog[location]。
+    """
+    global _command_catalog
+    if _command_catalog is None:
+        import hashlib
+        raw = json.dumps(COMMAND_TABLE, ensure_ascii=False, sort_keys=True)
+        version = hashlib.sha1(raw.encode('utf-8')).hexdigest()[:12]
+        _command_catalog = (version, COMMAND_TABLE)
+    return _command_catalog
+
+
+def get_location_commands(location: str) -> list[dict]:
+    """位置的全部可用指令（全局 + 位置专属）。返回共享列表，调用方不得修改"""
+    cached = _location_commands_cache.get(location)
+    if cached is None:
+        cached = list(COMMAND_TABLE.get('*', []))
+        cached.extend(COMMAND_TABLE.get(location, []))
+        _location_commands_cache[location] = cached
+    return cached
+
+
 # 确保目录存在
 os.makedirs(USERS_DIR, exist_ok=True)
 os.makedirs(CHAT_LOG_DIR, exist_ok=True)
 os.makedirs(CHAT_HISTORY_DIR, exist_ok=True)
+os.makedirs(SETTLEMENTS_DIR, exist_ok=True)
+os.makedirs(LEADERBOARD_DIR, exist_ok=True)
@@ -0,0 +1,278 @@
+"""
+引擎隔离 — 把指定游戏的引擎放进独立工作进程（可选）
+
+每个隔离游戏一个工作进程（spawn），进程内按 id 持有该游戏的全部引擎实例；
+大厅持有 RemoteEngine 代理，按 GameEngine 协议转发调用：
+  - 传输: multiprocessing.Pipe + pickle（最高协议），一问一答
+  - lobby 参数: 替换为子进程内的 _LobbyStub，只携带本次调用涉及玩家的位置；
+    引擎对 lobby 的写操作（set_player_location）记录下来回到大厅重放
+  - dict 参数（player_data 等）: 调用后把子进程中的修改同步回原对象
+  - 返回值: 原样返回（SharedMessage 等 Rich Result 可 pickle）
+
+不同游戏的引擎在各自进程中并行计算；引擎卡死（ENGINE_HOST_TIMEOUT）或进程崩溃时
+只影响该游戏：工作进程被重启，引擎在下次调用时重新创建（状态丢失），本次调用抛出 EngineCrashed。
+
+适用于通过协议方法交互的引擎。房间制指令处理器直接读写 get_room() 返回的房间对象，
+隔离后拿到的是副本，不适合开启。
+开启方式: GAME_INFO['isolated'] = True，或把 game_id 加入 ISOLATED_GAMES。
+"""
+
+import itertools
+import multiprocessing
+import pickle
+import threading
+import traceback
+
+from .config import ENGINE_HOST_TIMEOUT
+
+_PROTOCOL = pickle.HIGHEST_PROTOCOL
+_LOBBY = '\x00lobby'  # lobby 参数占位符
+
+
+class EngineCrashed(RuntimeError):
+    """工作进程崩溃或超时"""
+
+
+class RemoteEngineError(RuntimeError):
+    """引擎在工作进程中抛出的异常"""
+
+
+# ── 子进程 ──
+
+class _LobbyStub:
+    """子进程内的 lobby 替身：只读位置快照 + 记录写操作"""
+
+    def __init__(self, locations):
+        self.player_locations = locations
+        self.ops = []
+
+    def get_player_location(self, player_name):
+        return self.player_locations.get(player_name, 'lobby')
+
+    def set_player_location(self, player_name, location):
+        self.player_locations[player_name] = location
+        self.ops.append(('set_player_location', player_name, location))
+
+    def get_location_path(self, location, player_name=None):
+        from .config import get_location_breadcrumb
+        return get_location_breadcrumb(location)[2]
+
+    def get_parent_location(self, location):
+        from .config import LOCATION_HIERARCHY
+        info = LOCATION_HIERARCHY.get(location)
+        return (info[1] or 'lobby') if info else 'lobby'
+
+
+def _load_factory(game_id):
+    from games import get_game, is_game_loaded, load_game
+    module = get_game(game_id) if is_game_loaded(game_id) else load_game(game_id)
+    return getattr(module, 'GAME_INFO', {})['create_engine']
+
+
+def _public_methods(engine):
+    return [name for name in dir(engine)
+            if not name.startswith('_') and callable(getattr(engine, name, None))]
+
+
+def _worker_main(game_id, conn):
+    """工作进程主循环"""
+    create = _load_factory(game_id)
+    engines = {}
+    dropped = set()  # 已释放的引擎 id，不再隐式重建
+
+    def get(eid):
+        engine = engines.get(eid)
+        if engine is None:
+            if eid in dropped:
+                raise LookupError(f'引擎 #{eid} 已释放')
+            engine = engines[eid] = create()
+        return engine
+
+    while True:
+        try:
+            request = pickle.loads(conn.recv_bytes())
+        except (EOFError, OSError):
+            return
+        op, eid = request[0], request[1]
+        try:
+            if op == 'call':
+                _, _, method, args, locations = request
+                stub = _LobbyStub(locations)
+                args = [stub if isinstance(a, str) and a == _LOBBY else a for a in args]
+                result = getattr(get(eid), method)(*args)
+                dicts = [(i, a) for i, a in enumerate(args) if isinstance(a, dict)]
+                reply = ('ok', result, dicts, stub.ops)
+            elif op == 'open':
+                reply = ('ok', _public_methods(get(eid)))
+            elif op == 'dump':
+                # 不移除：落盘成功后大厅再发 drop，失败时引擎仍在
+                reply = ('ok', pickle.dumps(engines.get(eid), _PROTOCOL))
+            elif op == 'load':
+                engines[eid] = pickle.loads(request[2])
+                reply = ('ok', _public_methods(engines[eid]))
+            elif op == 'drop':
+                engines.pop(eid, None)
+                dropped.add(eid)
+                reply = ('ok', None)
+            else:
+                reply = ('error', f'未知操作 {op}')
+        except Exception as e:
+            reply = ('error', f'{type(e).__name__}: {e}\n{traceback.format_exc()}')
+        conn.send_bytes(pickle.dumps(reply, _PROTOCOL))
+
+
+# ── 大厅进程 ──
+
+class EngineHost:
+    """单个游戏的工作进程（调用按游戏串行）"""
+
+    def __init__(self, game_id, timeout=ENGINE_HOST_TIMEOUT):
+        self.game_id = game_id
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.generation = 0   # 每次（重）启动 +1，旧代的引擎 id 全部失效
+        self._process = None
+        self._conn = None
+
+    def _start(self):
+        ctx = multiprocessing.get_context('spawn')
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(target=_worker_main, args=(self.game_id, child_conn),
+                              name=f'engine-{self.game_id}', daemon=True)
+        process.start()
+        child_conn.close()
+        self._process, self._conn = process, parent_conn
+        self.generation += 1
+        print(f"[引擎隔离] {self.game_id} 工作进程已启动 (pid={process.pid})")
+
+    def _kill(self):
+        process, conn = self._process, self._conn
+        self._process = self._conn = None
+        if conn:
+            conn.close()
+        if process and process.is_alive():
+            process.kill()
+            process.join(1)
+
+    def request(self, *request):
+        """发送请求并等待回复。Returns: (回复, 进程代号)"""
+        with self.lock:
+            if self._process is None or not self._process.is_alive():
+                self._kill()
+                self._start()
+            generation = self.generation
+            try:
+                self._conn.send_bytes(pickle.dumps(request, _PROTOCOL))
+                if not self._conn.poll(self.timeout):
+                    raise TimeoutError(f'{self.timeout}s 内无响应')
+                reply = pickle.loads(self._conn.recv_bytes())
+            except (EOFError, OSError, TimeoutError) as e:
+                self._kill()
+                print(f"[引擎隔离] {self.game_id} 工作进程异常，已终止: {type(e).__name__} {e}")
+                raise EngineCrashed(f'{self.game_id} 引擎进程异常，请重试') from None
+        if reply[0] == 'error':
+            raise RemoteEngineError(reply[1].split('\n', 1)[0])
+        return reply, generation
+
+    def shutdown(self):
+        with self.lock:
+            self._kill()
+
+
+class RemoteEngine:
+    """工作进程中引擎的代理（实现 GameEngine 协议）"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, game_id, _state=None):
+        self.game_id = game_id
+        self.engine_id = next(RemoteEngine._ids)
+        self.host = get_engine_host(game_id)
+        if _state is None:
+            reply, self._generation = self.host.request('open', self.engine_id)
+        else:
+            reply, self._generation = self.host.request('load', self.engine_id, _state)
+        self._methods = frozenset(reply[1])
+
+    def _call(self, method, args):
+        from .lobby_engine import LobbyEngine
+        locations = {}
+        lobby = None
+        wire_args = []
+        for arg in args:
+            if isinstance(arg, LobbyEngine):
+                lobby = arg
+                wire_args.append(_LOBBY)
+            else:
+                wire_args.append(arg)
+        if lobby is not None:
+            for arg in args:
+                if isinstance(arg, str) and arg in lobby.player_locations:
+                    locations[arg] = lobby.player_locations[arg]
+
+        reply, generation = self.host.request('call', self.engine_id, method, wire_args, locations)
+        if generation != self._generation:
+            # 进程重启过，子进程中是新建的引擎
+            print(f"[引擎隔离] {self.game_id} 引擎 #{self.engine_id} 已在新进程中重建")
+            self._generation = generation
+        _, result, dicts, ops = reply
+        for i, new in dicts:
+            _sync_dict(args[i], new)
+        if lobby is not None:
+            for op, *op_args in ops:
+                getattr(lobby, op)(*op_args)
+        return result
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name not in self._methods:
+            raise AttributeError(name)
+        return lambda *args: self._call(name, args)
+
+    def close(self):
+        """释放工作进程中的引擎实例"""
+        try:
+            self.host.request('drop', self.engine_id)
+        except Exception:
+            pass
+
+    def __reduce__(self):
+        # 引擎池落盘：读取子进程中的引擎状态（不移除，写盘成功后由引擎池 close），
+        # 恢复时重新放进工作进程
+        reply, _ = self.host.request('dump', self.engine_id)
+        return _restore_remote, (self.game_id, reply[1])
+
+
+def _restore_remote(game_id, state):
+    return RemoteEngine(game_id, _state=state)
+
+
+def _sync_dict(target, new):
+    """把子进程中修改后的 dict 同步回原对象（保持对象身份）"""
+    for key in [k for k in target if k not in new]:
+        del target[key]
+    for key, value in new.items():
+        if target.get(key, _sync_dict) != value:
+            target[key] = value
+
+
+_hosts = {}
+_hosts_lock = threading.Lock()
+
+
+def get_engine_host(game_id):
+    """游戏的工作进程（首次使用时启动）"""
+    host = _hosts.get(game_id)
+    if host is None:
+        with _hosts_lock:
+            host = _hosts.get(game_id)
+            if host is None:
+                host = _hosts[game_id] = EngineHost(game_id)
+    return host
+
+
+def shutdown_engine_hosts():
+    with _hosts_lock:
+        hosts = list(_hosts.values())
+        _hosts.clear()
+    for host in hosts:
+        host.shutdown()
@@ -0,0 +1,242 @@
+"""
+per_player 引擎池 — LRU / 空闲回收 + 内存预算 + 可选落盘
+
+玩家断线时引擎不再立即销毁，而是标记为非活跃保留在池中，重连后直接复用；
+非活跃引擎空闲超时或超出数量/内存预算时按 LRU 回收。
+GAME_INFO['pool_persist'] 为 True 的游戏在回收时 pickle 落盘，
+再次取用时自动恢复，因此在线但长期空闲的玩家引擎也可以被回收。
+"""
+
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from .config import (
+    ENGINE_POOL_DIR, ENGINE_POOL_MAX_ENGINES, ENGINE_POOL_IDLE_SECONDS,
+    ENGINE_POOL_MEMORY_BUDGET, ENGINE_POOL_DEFAULT_ENGINE_BYTES,
+)
+from .engine_host import RemoteEngine
+
+
+class _PoolEntry:
+    __slots__ = ('engine', 'last_used', 'active', 'persist', 'size')
+
+    def __init__(self, engine, persist):
+        self.engine = engine
+        self.last_used = time.monotonic()
+        self.active = True
+        self.persist = persist
+        self.size = _engine_size(engine)  # 放入时估算，sweep 时刷新
+
+
+def _engine_size(engine):
+    """引擎内存估算：优先用引擎自报的 get_memory_usage()
+
+    隔离引擎不在本进程占内存，且查询需要一次进程间调用，按估算值计。
+    """
+    if isinstance(engine, RemoteEngine):
+        return ENGINE_POOL_DEFAULT_ENGINE_BYTES
+    getter = getattr(engine, 'get_memory_usage', None)
+    if getter:
+        try:
+            return int(getter())
+        except Exception:
+            pass
+    return ENGINE_POOL_DEFAULT_ENGINE_BYTES
+
+
+def _close_engine(engine):
+    """隔离引擎（RemoteEngine）出池时释放工作进程中的实例"""
+    if isinstance(engine, RemoteEngine):
+        engine.close()
+
+
+class EnginePool:
+    """per_player 引擎池（线程安全）"""
+
+    def __init__(self, max_engines=ENGINE_POOL_MAX_ENGINES,
+                 idle_seconds=ENGINE_POOL_IDLE_SECONDS,
+                 memory_budget=ENGINE_POOL_MEMORY_BUDGET,
+                 persist_dir=ENGINE_POOL_DIR):
+        self.max_engines = max_engines
+        self.idle_seconds = idle_seconds
+        self.memory_budget = memory_budget
+        self.persist_dir = persist_dir
+        self.lock = threading.RLock()
+        self._entries = OrderedDict()  # {key: _PoolEntry}，最久未用在前
+        self._bytes = 0  # 内存中引擎的估算总大小
+        self._on_disk = set()  # 已落盘的 key，查找未命中时不必访问磁盘
+        if os.path.isdir(persist_dir):
+            self._on_disk = {f[:-4] for f in os.listdir(persist_dir) if f.endswith('.pkl')}
+
+    # ── 落盘 ──
+
+    def _disk_path(self, key):
+        return os.path.join(self.persist_dir, f'{key}.pkl')
+
+    def _add(self, key, entry):
+        old = self._entries.get(key)
+        if old is not None:
+            self._bytes -= old.size
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._bytes += entry.size
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        return entry
+
+    def _save(self, key, engine):
+        try:
+            os.makedirs(self.persist_dir, exist_ok=True)
+            tmp_path = self._disk_path(key) + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(engine, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._disk_path(key))
+            self._on_disk.add(key)
+            return True
+        except Exception as e:
+            print(f"[引擎池] 落盘失败 {key}: {e}")
+            return False
+
+    def _restore(self, key):
+        if key not in self._on_disk:
+            return None
+        self._on_disk.discard(key)
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                engine = pickle.load(f)
+        except Exception as e:
+            print(f"[引擎池] 恢复失败 {key}: {e}")
+            engine = None
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return engine
+
+    # ── 取用 / 放入 ──
+
+    def get(self, key):
+        """取用引擎（标记为活跃），内存中没有时尝试从磁盘恢复"""
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                engine = self._restore(key)
+                if engine is None:
+                    return None
+                entry = _PoolEntry(engine, persist=True)
+                self._add(key, entry)
+            entry.active = True
+            entry.last_used = time.monotonic()
+            self._entries.move_to_end(key)
+            return entry.engine
+
+    def peek(self, key):
+        """只查内存中的引擎：不恢复落盘引擎，不改变活跃状态与 LRU 顺序"""
+        entry = self._entries.get(key)
+        return entry.engine if entry else None
+
+    def put(self, key, engine, persist=False):
+        """放入新引擎，超出预算时回收最久未用的引擎"""
+        with self.lock:
+            self._add(key, _PoolEntry(engine, persist))
+            self._enforce_budget()
+
+    def release(self, key):
+        """玩家断线：保留引擎以便快速重连，标记为可回收"""
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry:
+                entry.active = False
+                entry.last_used = time.monotonic()
+
+    def discard(self, key):
+        """彻底删除引擎（含磁盘副本）"""
+        with self.lock:
+            entry = self._pop(key)
+            if entry:
+                _close_engine(entry.engine)
+            self._on_disk.discard(key)
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def rename(self, old_key, new_key):
+        """玩家改名后迁移引擎"""
+        with self.lock:
+            entry = self._pop(old_key)
+            if entry:
+                self._add(new_key, entry)
+            if old_key in self._on_disk:
+                self._on_disk.discard(old_key)
+                try:
+                    os.replace(self._disk_path(old_key), self._disk_path(new_key))
+                    self._on_disk.add(new_key)
+                except OSError:
+                    pass
+
+    # ── 回收 ──
+
+    def _evictable(self, entry):
+        """非活跃引擎总可回收；活跃引擎只有可落盘时才回收"""
+        return not entry.active or entry.persist
+
+    def _evict(self, key):
+        entry = self._pop(key)
+        if entry.persist and not self._save(key, entry.engine):
+            if entry.active:
+                # 在线玩家的引擎落盘失败则保留
+                self._add(key, entry)
+                return False
+        _close_engine(entry.engine)
+        return True
+
+    def _enforce_budget(self):
+        """按 LRU 回收直到满足数量与内存预算（需持锁调用）"""
+        over_count = len(self._entries) - self.max_engines
+        over_bytes = 0
+        if self.memory_budget:
+            over_bytes = self._bytes - self.memory_budget
+        if over_count <= 0 and over_bytes <= 0:
+            return 0
+
+        evicted = 0
+        for key in list(self._entries):
+            if over_count <= 0 and over_bytes <= 0:
+                break
+            entry = self._entries[key]
+            if not self._evictable(entry):
+                continue
+            size = entry.size
+            if self._evict(key):
+                evicted += 1
+                over_count -= 1
+                over_bytes -= size
+        return evicted
+
+    def sweep(self):
+        """回收空闲超时的引擎并检查预算。Returns: 回收数量"""
+        deadline = time.monotonic() - self.idle_seconds
+        with self.lock:
+            # 引擎大小随游戏进行变化，周期性刷新估算值
+            for e in self._entries.values():
+                size = _engine_size(e.engine)
+                self._bytes += size - e.size
+                e.size = size
+            idle = [key for key, e in self._entries.items()
+                    if e.last_used < deadline and self._evictable(e)]
+            evicted = sum(1 for key in idle if self._evict(key))
+            evicted += self._enforce_budget()
+        if evicted:
+            print(f"[引擎池] 回收 {evicted} 个引擎，剩余 {len(self._entries)} 个")
+        return evicted
+
+    def __len__(self):
+        return len(self._entries)
@@ -10,6 +10,7 @@
 
 from __future__ import annotations
 
+import json
 from dataclasses import dataclass, field
 from typing import Protocol, runtime_checkable, Any
 
@@ -54,3 +55,34 @@ class GameEvent:
     type: str
     data: dict = field(default_factory=dict)
     target: str = ""  # 空=广播房间, 玩家名=点对点
+
+
+class SharedMessage:
+    """多人共享的消息 — 整条消息只序列化一次，所有接收者复用同一份字节
+
+    用于房间内广播的相同内容（如 room_update 桌面快照）：
+    同一个 SharedMessage 对象放进多个接收者的 send_to_players 列表，
+    分发时只做一次 game_event 包装 / 路径注入 / json 编码。
+    因人而异的内容（文字提示、location_update）仍用普通 dict 单独发送。
+    payload 编码后不应再修改。
+    """
+
+    __slots__ = ('payload', 'prepared', '_encoded')
+
+    def __init__(self, payload: dict):
+        self.payload = payload
+        self.prepared = False   # 分发器是否已完成包装/注入
+        self._encoded = None
+
+    def encode(self) -> bytes:
+        """编码后的帧（首次调用时编码并缓存）"""
+        if self._encoded is None:
+            self._encoded = (json.dumps(self.payload) + '\n').encode('utf-8')
+        return self._encoded
+
+    # 只读字典接口，兼容按 dict 读取消息的调用方
+    def __getitem__(self, key):
+        return self.payload[key]
+
+    def get(self, key, default=None):
+        return self.payload.get(key, default)
@@ -0,0 +1,168 @@
+"""
+段位排行榜 — 每个游戏一份有序索引，结算时增量更新
+
+按 (段位序号, 段位点) 降序排列，同分按玩家名排序；有序列表 + bisect，
+前 N 名为切片、查询个人名次为一次二分查找。
+持久化为 data/leaderboards/{game_id}.json（紧凑行格式 [玩家名, 段位ID, 段位点]），
+段位以 ID 保存，加载时按当前段位表换算序号。
+文件不存在时扫描一次用户文件原始数据（不做模板合并）重建。
+"""
+
+import bisect
+import json
+import os
+import threading
+
+from .config import LEADERBOARD_DIR, USERS_DIR
+from .user_schema import get_rank_table
+
+
+class Leaderboard:
+    """单个游戏的排行榜（线程安全）"""
+
+    def __init__(self, game_id, path):
+        self.game_id = game_id
+        self.path = path
+        self.lock = threading.RLock()
+        self._keys = []     # 升序 [(-段位序号, -段位点, 玩家名)]，即名次顺序
+        self._entries = {}  # {玩家名: (key, rank_id, points)}
+
+    # ── 更新 ──
+
+    def _make_key(self, name, rank_id, points):
+        return (-get_rank_table(self.game_id).rank_index(rank_id), -points, name)
+
+    def update(self, name, rank_id, points):
+        with self.lock:
+            old = self._entries.get(name)
+            if old:
+                if old[1] == rank_id and old[2] == points:
+                    return
+                self._remove_key(old[0])
+            key = self._make_key(name, rank_id, points)
+            bisect.insort(self._keys, key)
+            self._entries[name] = (key, rank_id, points)
+
+    def remove(self, name):
+        with self.lock:
+            old = self._entries.pop(name, None)
+            if old:
+                self._remove_key(old[0])
+            return old is not None
+
+    def rename(self, old_name, new_name):
+        with self.lock:
+            old = self._entries.get(old_name)
+            if old:
+                self.remove(old_name)
+                self.update(new_name, old[1], old[2])
+            return old is not None
+
+    def _remove_key(self, key):
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+
+    # ── 查询 ──
+
+    def top(self, n):
+        """前 n 名。Returns: [(玩家名, rank_id, points), ...]"""
+        with self.lock:
+            return [(key[2],) + self._entries[key[2]][1:] for key in self._keys[:n]]
+
+    def position(self, name):
+        """个人名次。Returns: (名次, 总人数)，未上榜为 None"""
+        with self.lock:
+            entry = self._entries.get(name)
+            if not entry:
+                return None
+            return bisect.bisect_left(self._keys, entry[0]) + 1, len(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    # ── 持久化 ──
+
+    def save(self):
+        with self.lock:
+            rows = [[key[2], self._entries[key[2]][1], self._entries[key[2]][2]] for key in self._keys]
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    def load(self):
+        """从文件加载。Returns: 是否存在排行榜文件"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, 'r', encoding='utf-8') as f:
+            rows = json.load(f)
+        self._fill(rows)
+        return True
+
+    def rebuild_from_users(self, users_dir=USERS_DIR):
+        """扫描用户文件原始数据重建（一次性迁移）"""
+        rows = []
+        if os.path.exists(users_dir):
+            for filename in os.listdir(users_dir):
+                if not filename.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(users_dir, filename), 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                except Exception:
+                    continue
+                game_data = data.get(self.game_id)
+                if isinstance(game_data, dict) and 'rank' in game_data:
+                    rows.append([filename[:-5], game_data['rank'], game_data.get('rank_points', 0)])
+        self._fill(rows)
+
+    def _fill(self, rows):
+        with self.lock:
+            entries = {}
+            for name, rank_id, points in rows:
+                entries[name] = (self._make_key(name, rank_id, points), rank_id, points)
+            self._entries = entries
+            self._keys = sorted(e[0] for e in entries.values())
+
+
+_boards = {}
+_boards_lock = threading.Lock()
+
+
+def get_leaderboard(game_id):
+    """获取游戏排行榜（首次使用时加载或重建）"""
+    board = _boards.get(game_id)
+    if board is None:
+        with _boards_lock:
+            board = _boards.get(game_id)
+            if board is None:
+                board = Leaderboard(game_id, os.path.join(LEADERBOARD_DIR, f'{game_id}.json'))
+                if not board.load():
+                    board.rebuild_from_users()
+                    board.save()
+                _boards[game_id] = board
+    return board
+
+
+def _persisted_game_ids():
+    if not os.path.exists(LEADERBOARD_DIR):
+        return []
+    return [f[:-5] for f in os.listdir(LEADERBOARD_DIR) if f.endswith('.json')]
+
+
+def rename_player(old_name, new_name):
+    """玩家改名：同步所有排行榜"""
+    for game_id in set(_persisted_game_ids()) | set(_boards):
+        board = get_leaderboard(game_id)
+        if board.rename(old_name, new_name):
+            board.save()
+
+
+def remove_player(name):
+    """玩家删号：从所有排行榜移除"""
+    for game_id in set(_persisted_game_ids()) | set(_boards):
+        board = get_leaderboard(game_id)
+        if board.remove(name):
+            board.save()
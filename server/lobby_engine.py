@@ -1,28 +1,50 @@
 """游戏大厅指令引擎"""
 
-from .config import COMMAND_TABLE, LOCATION_HIERARCHY, SERVER_VERSION
-from games import get_game, get_all_games, GAMES
+from .config import (
+    COMMAND_TABLE, LOCATION_HIERARCHY, SERVER_VERSION, PENDING_CONFIRM_TTL,
+    MATCHMAKING_TICK, ISOLATED_GAMES,
+    get_location_breadcrumb, get_location_commands,
+)
+from .command_router import CommandRouter, GLOBAL_SCOPE, GAME_SCOPE, DEFAULT_SCOPE
+from .render_cache import get_or_render
+from .engine_pool import EnginePool
+from .engine_host import RemoteEngine, EngineCrashed, RemoteEngineError
+from .timer_wheel import get_timer_wheel
+from . import leaderboard
+from games import get_game, get_all_games, get_game_for_location, is_game_loaded, GAMES
 
 
 class LobbyEngine:
     """游戏大厅指令引擎"""
 
     def __init__(self):
-        self.game_engines = {}  # 各游戏的引擎实例
+        self.game_engines = {}  # 共享（房间制）引擎实例 {game_id: engine}
+        self.engine_pool = EnginePool()  # per_player 引擎池 {f'{game_id}_{player_name}': engine}
         self.player_locations = {}  # {player_name: location}
         self.online_players = {}  # {player_name: player_data}
         self.invite_callback = None  # 邀请回调函数
+        self.dispatch_callback = None  # 异步结果分发回调（ChatServer.dispatch_game_result）
         self.pending_confirms = {}  # 大厅级待确认 {player_name: {'type':..., 'data':...}}
+        self._pending_timers = {}  # 待确认过期定时器 {player_name: TimerHandle}
+        self._room_handlers = set()  # 需要感知玩家下线的房间制指令处理器（匹配/旁观）
+        self._matchmakers = set()  # 有玩家排队的房间制指令处理器
+        self._match_timer = None
+        self.commands = CommandRouter()  # 指令路由表
+        self._register_builtin_commands()
 
     def set_invite_callback(self, callback):
         """设置邀请通知回调"""
         self.invite_callback = callback
 
+    def set_dispatch_callback(self, callback):
+        """设置异步结果分发回调（定时任务产生的 Rich Result 经此投递）"""
+        self.dispatch_callback = callback
+
     def register_player(self, player_name, player_data):
         """注册在线玩家"""
         self.online_players[player_name] = player_data
         self.player_locations[player_name] = 'lobby'
-        self.pending_confirms.pop(player_name, None)
+        self._clear_pending(player_name)
 
     def unregister_player(self, player_name):
         """注销玩家，返回需要通知的房间信息列表"""
@@ -32,19 +54,78 @@ class LobbyEngine:
         game_id = self._get_game_for_location(
             self.get_player_location(player_name))
         if game_id:
-            engine = self._get_engine(game_id, player_name)
+            # 已落盘的 per_player 引擎也要恢复后处理断线（随后 release 标记为可回收）
+            engine = self._get_engine(game_id, player_name, restore=True)
             if engine and hasattr(engine, 'handle_disconnect'):
-                notifications = engine.handle_disconnect(self, player_name)
-            # per_player 引擎断线后清除实例
-            info = self._get_game_info(game_id)
-            if info.get('per_player'):
-                self.game_engines.pop(f'{game_id}_{player_name}', None)
+                try:
+                    notifications = engine.handle_disconnect(self, player_name) or []
+                except (EngineCrashed, RemoteEngineError) as e:
+                    # 隔离引擎异常不影响下线清理
+                    print(f"[大厅] {game_id} 断线处理失败 {player_name}: {e}")
 
-        self.pending_confirms.pop(player_name, None)
+        # per_player 引擎断线后留在池中等待重连，由池按空闲/预算回收
+        for gid in GAMES:
+            if self._get_game_info(gid).get('per_player'):
+                self.engine_pool.release(f'{gid}_{player_name}')
+
+        for handler in list(self._room_handlers):
+            handler.handle_player_offline(player_name)
+
+        self._clear_pending(player_name)
         self.player_locations.pop(player_name, None)
         self.online_players.pop(player_name, None)
         return notifications
 
+    # ── 段位匹配（有玩家排队时每 MATCHMAKING_TICK 秒检查一次） ──
+
+    def register_room_handler(self, handler):
+        """登记房间制指令处理器，玩家下线时调用其 handle_player_offline()"""
+        self._room_handlers.add(handler)
+
+    def register_matchmaker(self, handler):
+        """登记有玩家排队的指令处理器，并确保匹配定时器在运行"""
+        self._room_handlers.add(handler)
+        self._matchmakers.add(handler)
+        if self._match_timer is None:
+            self._match_timer = get_timer_wheel().schedule(MATCHMAKING_TICK, self._matchmaking_tick)
+
+    def _matchmaking_tick(self):
+        self._match_timer = None
+        for handler in list(self._matchmakers):
+            try:
+                results = handler._match_tick(self)
+            except Exception as e:
+                print(f"[匹配] {getattr(handler, 'game_key', handler)} 匹配异常: {e}")
+                results = []
+            if self.dispatch_callback:
+                for result in results:
+                    self.dispatch_callback(result)
+            if not handler.has_queued_players():
+                self._matchmakers.discard(handler)
+        if self._matchmakers:
+            self._match_timer = get_timer_wheel().schedule(MATCHMAKING_TICK, self._matchmaking_tick)
+
+    # ── 待确认状态（PENDING_CONFIRM_TTL 秒后自动过期） ──
+
+    def _set_pending(self, player_name, entry):
+        """设置待确认状态并登记过期定时器（覆盖旧状态时取消旧定时器）"""
+        wheel = get_timer_wheel()
+        self.pending_confirms[player_name] = entry
+        wheel.cancel(self._pending_timers.pop(player_name, None))
+        self._pending_timers[player_name] = wheel.schedule(
+            PENDING_CONFIRM_TTL, self._expire_pending, player_name, entry)
+
+    def _clear_pending(self, player_name):
+        """清除待确认状态"""
+        self.pending_confirms.pop(player_name, None)
+        get_timer_wheel().cancel(self._pending_timers.pop(player_name, None))
+
+    def _expire_pending(self, player_name, entry):
+        """定时轮回调：状态未被替换时清除"""
+        if self.pending_confirms.get(player_name) is entry:
+            self.pending_confirms.pop(player_name, None)
+            self._pending_timers.pop(player_name, None)
+
     def get_player_location(self, player_name):
         """获取玩家当前位置"""
         return self.player_locations.get(player_name, 'lobby')
@@ -84,37 +165,24 @@ class LobbyEngine:
         """获取位置的完整路径（面包屑导航）
         
         当提供 player_name 且玩家在房间中时，自动附加房间号。
+        静态部分来自缓存，只有房间号在此拼接。
         """
-        path = []
-        path_keys = []
-        current = location
-        while current:
-            info = LOCATION_HIERARCHY.get(current)
-            if info:
-                path.append(info[0])
-                path_keys.append(current)
-                current = info[1]
-            else:
-                path.append(current)
-                path_keys.append(current)
-                break
-        path.reverse()
-        path_keys.reverse()
-        if not path:
-            return '游戏大厅'
+        names, room_idx, joined = get_location_breadcrumb(location)
         # 附加房间号到"房间"层级
-        if player_name and location and ('_room' in location or '_playing' in location):
+        if player_name and room_idx >= 0 and ('_room' in location or '_playing' in location):
             game_id = self._get_game_for_location(location)
             if game_id:
                 engine = self._get_engine(game_id, player_name)
                 if engine and hasattr(engine, 'get_player_room'):
-                    room = engine.get_player_room(player_name)
+                    try:
+                        room = engine.get_player_room(player_name)
+                    except (EngineCrashed, RemoteEngineError):
+                        room = None
                     if room and hasattr(room, 'room_id'):
-                        for i, key in enumerate(path_keys):
-                            if '_room' in key:
-                                path[i] = f"{path[i]}#{room.room_id}"
-                                break
-        return ' > '.join(path)
+                        path = list(names)
+                        path[room_idx] = f"{path[room_idx]}#{room.room_id}"
+                        return ' > '.join(path)
+        return joined
 
     def get_parent_location(self, location):
         """获取父位置"""
@@ -128,26 +196,17 @@ class LobbyEngine:
         return list(self.online_players.keys())
 
     def get_commands_for_location(self, location: str) -> list[dict]:
-        """获取指定位置的全部可用指令（全局 + 位置专属，含游戏注册的指令）"""
-        commands = list(COMMAND_TABLE.get('*', []))
-        commands.extend(COMMAND_TABLE.get(location, []))
-        return commands
+        """获取指定位置的全部可用指令（全局 + 位置专属，含游戏注册的指令）
+
+        返回缓存的共享列表，调用方不得修改。
+        """
+        return get_location_commands(location)
 
     # ── 游戏路由 helpers ──
 
     def _get_game_for_location(self, location):
-        """根据位置确定玩家在哪个游戏中"""
-        if location in ('lobby', 'profile'):
-            return None
-        for game_id, module in GAMES.items():
-            info = getattr(module, 'GAME_INFO', {})
-            if location in info.get('locations', {}):
-                return game_id
-        # 后备: 根据前缀
-        for game_id in GAMES:
-            if location.startswith(game_id):
-                return game_id
-        return None
+        """根据位置确定玩家在哪个游戏中（查 register_game 预建的路由表）"""
+        return get_game_for_location(location)
 
     def _get_game_info(self, game_id):
         """获取游戏的GAME_INFO"""
@@ -156,40 +215,59 @@ class LobbyEngine:
             return getattr(module, 'GAME_INFO', {})
         return {}
 
-    def _get_engine(self, game_id, player_name=None):
-        """获取游戏引擎实例（per_player 用带玩家名的 key）"""
+    def _get_engine(self, game_id, player_name=None, restore=False):
+        """获取游戏引擎实例（per_player 用带玩家名的 key）
+
+        per_player 引擎默认只查内存（状态/路径等查询）；restore=True 时按取用处理：
+        标记活跃并在需要时从磁盘恢复（执行指令时使用）。
+        """
         info = self._get_game_info(game_id)
         if info.get('per_player'):
-            return self.game_engines.get(f'{game_id}_{player_name}')
+            key = f'{game_id}_{player_name}'
+            return self.engine_pool.get(key) if restore else self.engine_pool.peek(key)
         return self.game_engines.get(game_id)
 
+    def _engine_factory(self, game_id, info):
+        """引擎工厂：隔离的游戏在工作进程中创建，大厅只持有代理"""
+        create = info.get('create_engine')
+        if create and (info.get('isolated') or game_id in ISOLATED_GAMES):
+            return lambda: RemoteEngine(game_id)
+        return create
+
     def _ensure_engine(self, game_id, player_name=None):
         """确保引擎存在，不存在则创建"""
         info = self._get_game_info(game_id)
         if info.get('per_player'):
             key = f'{game_id}_{player_name}'
-        else:
-            key = game_id
-
-        if key not in self.game_engines:
-            create = info.get('create_engine')
+            engine = self.engine_pool.get(key)
+            if engine is None:
+                create = self._engine_factory(game_id, info)
+                if create:
+                    engine = create()
+                    self.engine_pool.put(key, engine, persist=bool(info.get('pool_persist')))
+            return engine
+
+        if game_id not in self.game_engines:
+            create = self._engine_factory(game_id, info)
             if create:
-                self.game_engines[key] = create()
+                self.game_engines[game_id] = create()
 
-        return self.game_engines.get(key)
+        return self.game_engines.get(game_id)
 
     # ── 帮助 / 列表 ──
 
     def get_main_help(self):
-        """获取主帮助文本"""
+        """获取主帮助文本（缓存）"""
+        return get_or_render(('main_help',), self._render_main_help)
+
+    def _render_main_help(self):
         from .text_utils import pad_left
-        games = get_all_games()
-        game_list = ""
-        for game in games:
+        game_list = []
+        for game in get_all_games():
             icon = game.get('icon', '🎮')
             name = game.get('name', game.get('id', '???'))
             game_id = game.get('id', '???')
-            game_list += f"  {icon} {pad_left(name, 12)} play {game_id}\n"
+            game_list.append(f"  {icon} {pad_left(name, 12)} play {game_id}\n")
 
         return (
             "\n========== 游戏大厅 ==========\n\n"
@@ -202,7 +280,7 @@ class LobbyEngine:
             "  back           - 返回上一级\n"
             "  home           - 直接返回大厅\n\n"
             "【可用游戏】\n"
-            f"{game_list}"
+            f"{''.join(game_list)}"
             "\n【个人中心】\n"
             "  profile        - 查看个人资料\n"
             "  mytitle        - 查看我的头衔\n"
@@ -216,18 +294,30 @@ class LobbyEngine:
         )
 
     def get_game_help(self, game_id, page=None):
-        """获取游戏帮助文本（通用）"""
+        """获取游戏帮助文本（通用，按 game_id + page 缓存；未注册的游戏不缓存）"""
+        if game_id not in GAMES:
+            return f"未找到游戏: {game_id}"
+        return get_or_render(('game_help', game_id, page),
+                             lambda: self._render_game_help(game_id, page))
+
+    def _render_game_help(self, game_id, page):
         game_module = get_game(game_id)
         if not game_module:
             return f"未找到游戏: {game_id}"
 
-        # 优先: 模块提供的 get_help_text(page)
-        get_help = getattr(game_module, 'get_help_text', None)
-        if get_help:
-            return get_help(page)
-
         info = getattr(game_module, 'GAME_INFO', {})
 
+        # 优先: 模块提供的 get_help_text(page)；懒注册未加载的游戏不为帮助导入模块，
+        # 改用 manifest 的 help_pages {页名: 文本}（'' 为首页），加载后缓存随之失效
+        if is_game_loaded(game_id):
+            get_help = getattr(game_module, 'get_help_text', None)
+            if get_help:
+                return get_help(page)
+        else:
+            pages = info.get('help_pages')
+            if pages:
+                return pages.get(page or '', pages.get('', f"没有帮助页: {page}"))
+
         # 尝试从帮助文件读取
         import os
         for filename in ('help.md', 'help.txt'):
@@ -247,24 +337,26 @@ class LobbyEngine:
         return f"{name}\n{desc}\n\n玩家人数: {min_p}-{max_p}人\n"
 
     def get_games_list(self):
-        """获取游戏列表"""
-        games = get_all_games()
-        text = "【游戏列表】\n\n"
-        for game in games:
+        """获取游戏列表（缓存）"""
+        return get_or_render(('games_list',), self._render_games_list)
+
+    def _render_games_list(self):
+        parts = ["【游戏列表】\n\n"]
+        for game in get_all_games():
             icon = game.get('icon', '🎮')
             name = game.get('name', game.get('id', '???'))
             game_id = game.get('id', '???')
             min_p = game.get('min_players', '?')
             max_p = game.get('max_players', '?')
             desc = game.get('description', '')
-            text += f"  {icon} {name}\n"
-            text += f"     ID: {game_id}\n"
-            text += f"     人数: {min_p}-{max_p}人\n"
+            parts.append(f"  {icon} {name}\n")
+            parts.append(f"     ID: {game_id}\n")
+            parts.append(f"     人数: {min_p}-{max_p}人\n")
             if desc:
-                text += f"     {desc}\n"
-            text += "\n"
-        text += "使用 play <游戏ID> 进入游戏"
-        return text
+                parts.append(f"     {desc}\n")
+            parts.append("\n")
+        parts.append("使用 play <游戏ID> 进入游戏")
+        return ''.join(parts)
 
     # ── 个人资料 ──
 
@@ -317,43 +409,80 @@ class LobbyEngine:
             )
         }
 
-    def _handle_profile_command(self, player_name, player_data, cmd, args):
-        """处理个人资料页面的指令"""
-        if cmd == '/avatar':
-            return {'action': 'request_avatar'}
-
-        if cmd == '/rename':
-            if not args:
-                return "用法: rename <新用户名>"
-            new_name = args
-            rename_cards = player_data.get('inventory', {}).get('rename_card', 0)
-            if rename_cards <= 0:
-                return "你没有改名卡了。"
-            if len(new_name) < 2 or len(new_name) > 12:
-                return "用户名长度需要在2-12个字符之间。"
-            from .player_manager import PlayerManager
-            if PlayerManager.player_exists(new_name):
-                return f"用户名 '{new_name}' 已被使用。"
-            self.pending_confirms[player_name] = {
-                'type': 'rename',
-                'data': new_name
-            }
-            return f"确定要将用户名改为 '{new_name}' 吗？（消耗1张改名卡）\n输入 y 确认，其他任意键取消。"
-
-        if cmd == '/password':
-            self.pending_confirms[player_name] = {'type': 'password_start'}
-            return "请输入新密码（6-20个字符）："
+    def _cmd_avatar(self, player_name, player_data, args, location):
+        """个人资料: 修改头像"""
+        return {'action': 'request_avatar'}
 
-        if cmd == '/delete':
-            self.pending_confirms[player_name] = {'type': 'delete_start'}
-            return "警告：删除账号不可恢复！\n请输入你的用户名以确认："
-
-        return None
+    def _cmd_rename(self, player_name, player_data, args, location):
+        """个人资料: 修改用户名"""
+        if not args:
+            return "用法: rename <新用户名>"
+        new_name = args
+        rename_cards = player_data.get('inventory', {}).get('rename_card', 0)
+        if rename_cards <= 0:
+            return "你没有改名卡了。"
+        if len(new_name) < 2 or len(new_name) > 12:
+            return "用户名长度需要在2-12个字符之间。"
+        from .player_manager import PlayerManager
+        if PlayerManager.player_exists(new_name):
+            return f"用户名 '{new_name}' 已被使用。"
+        self._set_pending(player_name, {
+            'type': 'rename',
+            'data': new_name
+        })
+        return f"确定要将用户名改为 '{new_name}' 吗？（消耗1张改名卡）\n输入 y 确认，其他任意键取消。"
+
+    def _cmd_password(self, player_name, player_data, args, location):
+        """个人资料: 修改密码"""
+        self._set_pending(player_name, {'type': 'password_start'})
+        return "请输入新密码（6-20个字符）："
+
+    def _cmd_delete(self, player_name, player_data, args, location):
+        """个人资料: 删除账号"""
+        self._set_pending(player_name, {'type': 'delete_start'})
+        return "警告：删除账号不可恢复！\n请输入你的用户名以确认："
 
     # ══════════════════════════════════════════════════
     #  核心指令处理
     # ══════════════════════════════════════════════════
 
+    def _register_builtin_commands(self):
+        """按 commands.json 条目绑定大厅指令，并注册各作用域的 /back /home"""
+        handlers = {
+            'help': self._cmd_help,
+            'games': self._cmd_games,
+            'play': self._cmd_play,
+            'profile': self._cmd_profile,
+            'mytitle': self._cmd_mytitle,
+            'alltitle': self._cmd_alltitle,
+            'title': self._cmd_title,
+            'item': self._cmd_item,
+            'clear': self._cmd_clear,
+            'version': self._cmd_version,
+            'exit': self._cmd_exit,
+            'avatar': self._cmd_avatar,
+            'rename': self._cmd_rename,
+            'password': self._cmd_password,
+            'delete': self._cmd_delete,
+        }
+        self.commands.bind_table(COMMAND_TABLE, handlers, scopes=(GLOBAL_SCOPE, 'profile'))
+
+        # /back /home 随位置作用域不同而不同
+        self.commands.register('back', self._cmd_profile_back, 'profile')
+        self.commands.register('home', self._cmd_profile_back, 'profile')
+        self.commands.register('back', self._cmd_game_back, GAME_SCOPE)
+        self.commands.register('home', self._cmd_game_home, GAME_SCOPE)
+        self.commands.register('back', self._cmd_lobby_back, DEFAULT_SCOPE)
+        self.commands.register('home', self._cmd_lobby_back, DEFAULT_SCOPE)
+
+    def register_command(self, name, handler, scope=GLOBAL_SCOPE):
+        """注册指令（游戏/插件扩展用）
+
+        handler(player_name, player_data, args, location)，返回 None 表示未处理。
+        scope: '*' 全局 / 位置ID / '@game' 游戏位置兜底 / '@default' 非游戏位置兜底
+        """
+        self.commands.register(name, handler, scope)
+
     def process_command(self, player_data, command):
         """处理指令"""
         player_name = player_data['name']
@@ -370,96 +499,24 @@ class LobbyEngine:
             if result is not None:
                 return result
 
-        # ── 2. 全局指令（任何位置有效）──
-        if cmd == '/help':
-            if args:
-                help_parts = args.split(None, 1)
-                game_id = help_parts[0].lower()
-                page = help_parts[1] if len(help_parts) > 1 else None
-                return self.get_game_help(game_id, page)
-            # 在游戏中 /help 无参数 → 显示游戏帮助
-            game_id = self._get_game_for_location(location)
-            if game_id:
-                return self.get_game_help(game_id)
-            return self.get_main_help()
-
-        if cmd == '/games':
-            return self.get_games_list()
-
-        if cmd == '/clear':
-            return {'action': 'clear'}
-
-        if cmd == '/version':
-            return {'action': 'version', 'server_version': SERVER_VERSION}
-
-        if cmd == '/exit':
-            self.pending_confirms[player_name] = {'type': 'exit'}
-            return '⚠ exit 会关闭整个程序！确定要退出吗？输入 y 确认。'
-
-        if cmd == '/profile':
-            return self.get_profile(player_data)
-
-        # ── 3. 背包/头衔指令（任何位置有效）──
-        if cmd == '/item':
-            return self._cmd_item(player_data, args)
-
-        if cmd == '/mytitle':
-            return self._cmd_mytitle(player_data)
-
-        if cmd == '/alltitle':
-            return self._cmd_alltitle(player_data, args)
-
-        if cmd == '/title':
-            return self._cmd_title(player_name, player_data, args)
-
-        # ── 4. 个人资料页面 ──
-        if location == 'profile':
-            result = self._handle_profile_command(
-                player_name, player_data, cmd, args)
+        # ── 2. 路由表（全局 → 位置专属 → 游戏/大厅兜底）──
+        game_id = self._get_game_for_location(location)
+        handler = self.commands.resolve(cmd, location, game_id is not None)
+        if handler:
+            result = handler(player_name, player_data, args, location)
             if result is not None:
                 return result
-            if cmd in ('/back', '/home'):
-                self.set_player_location(player_name, 'lobby')
-                return {
-                    'action': 'location_update',
-                    'message': '已返回游戏大厅。'
-                }
-
-        # ── 5. 进入游戏 ──
-        if cmd == '/play':
-            if location not in ('lobby', 'profile'):
-                return '请先返回大厅再进入其他游戏。'
-            if not args:
-                return '用法: play <游戏ID>'
-            return self._enter_game(player_name, player_data, args.lower().strip())
-
-        # ── 6. 游戏内指令路由 ──
-        game_id = self._get_game_for_location(location)
+
+        # ── 3. 游戏内指令直达引擎 ──
         if game_id:
-            engine = self._get_engine(game_id, player_name)
+            engine = self._get_engine(game_id, player_name, restore=True)
             if engine:
-                if cmd == '/back':
-                    return engine.handle_back(self, player_name, player_data)
-                if cmd == '/home':
-                    return engine.handle_quit(self, player_name, player_data)
-                # 其他游戏指令
                 result = engine.handle_command(
                     self, player_name, player_data, cmd, args)
                 if result is not None:
                     return result
             return '未知指令。'
 
-        # ── 7. 大厅 /back, /home ──
-        if cmd in ('/back', '/home'):
-            if location == 'lobby':
-                return '你已经在大厅了。'
-            parent = self.get_parent_location(location)
-            self.set_player_location(player_name, parent)
-            return {
-                'action': 'location_update',
-                'message': f"已返回{self.get_location_path(parent)}。"
-            }
-
         if not cmd.startswith('/'):
             if location == 'profile':
                 return '请输入头衔编号。'
@@ -467,6 +524,72 @@ class LobbyEngine:
 
         return '未知指令。'
 
+    # ── 内置指令 ──
+
+    def _cmd_help(self, player_name, player_data, args, location):
+        if args:
+            help_parts = args.split(None, 1)
+            game_id = help_parts[0].lower()
+            page = help_parts[1] if len(help_parts) > 1 else None
+            return self.get_game_help(game_id, page)
+        # 在游戏中 /help 无参数 → 显示游戏帮助
+        game_id = self._get_game_for_location(location)
+        if game_id:
+            return self.get_game_help(game_id)
+        return self.get_main_help()
+
+    def _cmd_games(self, player_name, player_data, args, location):
+        return self.get_games_list()
+
+    def _cmd_clear(self, player_name, player_data, args, location):
+        return {'action': 'clear'}
+
+    def _cmd_version(self, player_name, player_data, args, location):
+        return {'action': 'version', 'server_version': SERVER_VERSION}
+
+    def _cmd_exit(self, player_name, player_data, args, location):
+        self._set_pending(player_name, {'type': 'exit'})
+        return '⚠ exit 会关闭整个程序！确定要退出吗？输入 y 确认。'
+
+    def _cmd_profile(self, player_name, player_data, args, location):
+        return self.get_profile(player_data)
+
+    def _cmd_play(self, player_name, player_data, args, location):
+        if location not in ('lobby', 'profile'):
+            return '请先返回大厅再进入其他游戏。'
+        if not args:
+            return '用法: play <游戏ID>'
+        return self._enter_game(player_name, player_data, args.lower().strip())
+
+    def _cmd_profile_back(self, player_name, player_data, args, location):
+        self.set_player_location(player_name, 'lobby')
+        return {
+            'action': 'location_update',
+            'message': '已返回游戏大厅。'
+        }
+
+    def _cmd_game_back(self, player_name, player_data, args, location):
+        engine = self._get_engine(self._get_game_for_location(location), player_name, restore=True)
+        if not engine:
+            return '未知指令。'
+        return engine.handle_back(self, player_name, player_data)
+
+    def _cmd_game_home(self, player_name, player_data, args, location):
+        engine = self._get_engine(self._get_game_for_location(location), player_name, restore=True)
+        if not engine:
+            return '未知指令。'
+        return engine.handle_quit(self, player_name, player_data)
+
+    def _cmd_lobby_back(self, player_name, player_data, args, location):
+        if location == 'lobby':
+            return '你已经在大厅了。'
+        parent = self.get_parent_location(location)
+        self.set_player_location(player_name, parent)
+        return {
+            'action': 'location_update',
+            'message': f"已返回{self.get_location_path(parent)}。"
+        }
+
     # ── 进入游戏 ──
 
     def _enter_game(self, player_name, player_data, game_id):
@@ -479,6 +602,11 @@ class LobbyEngine:
         if not engine:
             return f"游戏引擎初始化失败: {game_id}"
 
+        # 懒加载的游戏首次载入后，为在线玩家补齐该游戏的默认数据
+        if game_id not in player_data:
+            from .user_schema import ensure_user_schema
+            ensure_user_schema(player_data)
+
         info = self._get_game_info(game_id)
 
         # 设置位置 — 用游戏根位置
@@ -518,49 +646,49 @@ class LobbyEngine:
 
         # 退出确认
         if pending_type == 'exit':
-            self.pending_confirms.pop(player_name, None)
+            self._clear_pending(player_name)
             if cmd == '/y':
                 return {'action': 'exit'}
             return '已取消。'
 
         # 改名确认
         if pending_type == 'rename':
-            self.pending_confirms.pop(player_name, None)
+            self._clear_pending(player_name)
             if cmd == '/y':
                 return self._do_rename(player_name, player_data, pending_data)
             return '已取消改名。'
 
         # 修改密码 - 输入新密码
         if pending_type == 'password_start':
-            self.pending_confirms.pop(player_name, None)
+            self._clear_pending(player_name)
             new_password = raw_input
             if len(new_password) < 6 or len(new_password) > 20:
                 return '密码长度需要在6-20个字符之间。已取消。'
-            self.pending_confirms[player_name] = {
+            self._set_pending(player_name, {
                 'type': 'password_confirm',
                 'data': new_password
-            }
+            })
             return '请再次输入新密码确认：'
 
         # 修改密码 - 确认密码
         if pending_type == 'password_confirm':
-            self.pending_confirms.pop(player_name, None)
+            self._clear_pending(player_name)
             if raw_input != pending_data:
                 return '两次输入的密码不一致。已取消。'
             return self._do_change_password(player_name, pending_data)
 
         # 删除账号 - 确认用户名
         if pending_type == 'delete_start':
-            self.pending_confirms.pop(player_name, None)
+            self._clear_pending(player_name)
             input_name = raw_input
             if input_name != player_name:
                 return '用户名不匹配。已取消。'
-            self.pending_confirms[player_name] = {'type': 'delete_password'}
+            self._set_pending(player_name, {'type': 'delete_password'})
             return '请输入你的密码：'
 
         # 删除账号 - 确认密码
         if pending_type == 'delete_password':
-            self.pending_confirms.pop(player_name, None)
+            self._clear_pending(player_name)
             input_password = raw_input
             return self._do_delete_account(player_name, input_password)
 
@@ -568,7 +696,7 @@ class LobbyEngine:
 
     # ── 背包/头衔指令 ──
 
-    def _cmd_item(self, player_data, args):
+    def _cmd_item(self, player_name, player_data, args, location):
         """背包指令"""
         from .user_schema import ITEM_LIBRARY, ITEM_SOURCES
         inventory = player_data.get('inventory', {})
@@ -599,7 +727,7 @@ class LobbyEngine:
             text += "(背包空空如也)\n"
         return text
 
-    def _cmd_mytitle(self, player_data):
+    def _cmd_mytitle(self, player_name, player_data, args, location):
         """查看我的头衔"""
         from .user_schema import get_title_name, TITLE_LIBRARY
         titles = player_data.get('titles', {'owned': ['newcomer'], 'displayed': ['newcomer']})
@@ -628,23 +756,42 @@ class LobbyEngine:
         text += "\n/alltitle - 查看头衔图鉴"
         return text
 
-    def _cmd_alltitle(self, player_data, args):
-        """查看头衔图鉴"""
-        from .user_schema import TITLE_LIBRARY, TITLE_SOURCES, get_title_name
+    def _cmd_alltitle(self, player_name, player_data, args, location):
+        """查看头衔图鉴（目录部分缓存，只叠加玩家的已获得标记）"""
+        from .user_schema import TITLE_SOURCES
         titles = player_data.get('titles', {'owned': ['newcomer'], 'displayed': ['newcomer']})
-        owned = titles.get('owned', [])
+        owned = set(titles.get('owned', []))
 
         filter_source = args.strip() if args else None
         if filter_source and filter_source not in TITLE_SOURCES:
-            text = "可用的筛选类别:\n"
-            for src, name in TITLE_SOURCES.items():
-                count = sum(1 for t in TITLE_LIBRARY.values() if t.get('source') == src)
-                text += f"  alltitle {src}  {name} ({count}个头衔)\n"
-            return text
+            return get_or_render(('title_sources',), self._render_title_sources)
+
+        segments = get_or_render(('title_catalog', filter_source),
+                                 lambda: self._render_title_catalog(filter_source))
+        parts = []
+        for seg in segments:
+            if isinstance(seg, str):
+                parts.append(seg)
+            else:
+                tid, owned_text, unowned_text = seg
+                parts.append(owned_text if tid in owned else unowned_text)
+        return ''.join(parts)
+
+    def _render_title_sources(self):
+        from .user_schema import TITLE_LIBRARY, TITLE_SOURCES
+        text = "可用的筛选类别:\n"
+        for src, name in TITLE_SOURCES.items():
+            count = sum(1 for t in TITLE_LIBRARY.values() if t.get('source') == src)
+            text += f"  alltitle {src}  {name} ({count}个头衔)\n"
+        return text
 
-        text = "【头衔图鉴】\n"
+    def _render_title_catalog(self, filter_source):
+        """预渲染图鉴目录。Returns: [静态文本 | (title_id, 已获得文本, 未获得文本), ...]"""
+        from .user_schema import TITLE_LIBRARY, TITLE_SOURCES
+        header = "【头衔图鉴】\n"
         if filter_source:
-            text += f"(筛选: {TITLE_SOURCES.get(filter_source, filter_source)})\n"
+            header += f"(筛选: {TITLE_SOURCES.get(filter_source, filter_source)})\n"
+        segments = [header]
 
         current_source = None
         for tid, info in TITLE_LIBRARY.items():
@@ -652,19 +799,19 @@ class LobbyEngine:
             if filter_source and source != filter_source:
                 continue
             if source != current_source:
-                if current_source is not None:
-                    text += "\n"
+                segments.append(
+                    ("\n" if current_source is not None else "")
+                    + f"\n--- {TITLE_SOURCES.get(source, source)} ---\n")
                 current_source = source
-                text += f"\n--- {TITLE_SOURCES.get(source, source)} ---\n"
-            is_owned = tid in owned
-            status = '[已获得]' if is_owned else '[未获得]'
-            text += f"  {status} {info.get('name', tid)}"
-            text += f"       {info.get('desc', '')}\n"
-            if not is_owned:
-                text += f"       条件: {info.get('condition', '')}\n"
-        return text
-
-    def _cmd_title(self, player_name, player_data, args):
+            line = f" {info.get('name', tid)}       {info.get('desc', '')}\n"
+            segments.append((
+                tid,
+                f"  [已获得]{line}",
+                f"  [未获得]{line}       条件: {info.get('condition', '')}\n",
+            ))
+        return segments
+
+    def _cmd_title(self, player_name, player_data, args, location):
         """切换头衔显示"""
         from .user_schema import TITLE_LIBRARY, get_title_name
         from .player_manager import PlayerManager
@@ -756,6 +903,9 @@ class LobbyEngine:
             self.online_players[new_name] = self.online_players.pop(old_name)
         location = self.player_locations.pop(old_name, 'lobby')
         self.player_locations[new_name] = location
+        for game_id in GAMES:
+            self.engine_pool.rename(f'{game_id}_{old_name}', f'{game_id}_{new_name}')
+        leaderboard.rename_player(old_name, new_name)
 
         PlayerManager.save_player_data(new_name, player_data)
 
@@ -788,5 +938,8 @@ class LobbyEngine:
         if success:
             self.online_players.pop(player_name, None)
             self.player_locations.pop(player_name, None)
+            for game_id in GAMES:
+                self.engine_pool.discard(f'{game_id}_{player_name}')
+            leaderboard.remove_player(player_name)
             return {'action': 'account_deleted', 'message': '账号已删除。再见！'}
         return '删除账号失败，请稍后重试。'
@@ -0,0 +1,131 @@
+"""
+段位匹配队列 — 按段位序号分桶，等待越久匹配窗口越宽
+
+每个 (游戏, 场次类型) 一个 MatchQueue：
+  - 队列按 get_rank_order() 的段位序号分桶，桶内按入队先后排列
+  - 匹配窗口 = 基础窗口 + 等待秒数 // MATCH_WIDEN_SECONDS（不超过 MATCH_MAX_WINDOW）
+  - 双方窗口都覆盖对方段位才算兼容，同组任意两人都须兼容；等待最久的玩家优先成组
+凑齐 group_size 人后由 BaseRoomCommandHandler 自动建房。
+"""
+
+import threading
+import time
+
+from .config import MATCH_BASE_WINDOW, MATCH_WIDEN_SECONDS, MATCH_MAX_WINDOW
+
+
+class _Ticket:
+    __slots__ = ('name', 'rank_idx', 'joined_at')
+
+    def __init__(self, name, rank_idx):
+        self.name = name
+        self.rank_idx = rank_idx
+        self.joined_at = time.monotonic()
+
+
+class MatchQueue:
+    """单个场次类型的匹配队列（线程安全）"""
+
+    def __init__(self, rank_count, group_size, base_window=MATCH_BASE_WINDOW,
+                 widen_seconds=MATCH_WIDEN_SECONDS, max_window=MATCH_MAX_WINDOW):
+        self.group_size = group_size
+        self.base_window = base_window
+        self.widen_seconds = widen_seconds
+        self.max_window = max_window
+        self.lock = threading.Lock()
+        self._buckets = [{} for _ in range(max(1, rank_count))]  # [{name: _Ticket}]
+        self._tickets = {}  # {name: _Ticket}，入队先后
+        self._taken = {}    # 最近一次 take_groups 取出的 {name: _Ticket}，供 requeue 保留等待时间
+
+    def enqueue(self, name, rank_idx):
+        """入队（已在队列中时刷新段位但保留等待时间）"""
+        rank_idx = max(0, min(rank_idx, len(self._buckets) - 1))
+        with self.lock:
+            ticket = self._tickets.get(name)
+            if ticket:
+                del self._buckets[ticket.rank_idx][name]
+                ticket.rank_idx = rank_idx
+            else:
+                ticket = self._tickets[name] = _Ticket(name, rank_idx)
+            self._buckets[rank_idx][name] = ticket
+
+    def requeue(self, name, rank_idx):
+        """把刚被取出的玩家放回队列（成组失败时），保留原等待时间"""
+        rank_idx = max(0, min(rank_idx, len(self._buckets) - 1))
+        with self.lock:
+            ticket = self._taken.pop(name, None)
+            if name in self._tickets:
+                ticket = self._tickets[name]
+                del self._buckets[ticket.rank_idx][name]
+            elif ticket is None:
+                ticket = _Ticket(name, rank_idx)
+            ticket.rank_idx = rank_idx
+            self._tickets[name] = ticket
+            self._buckets[rank_idx][name] = ticket
+
+    def dequeue(self, name):
+        """出队。Returns: 是否在队列中"""
+        with self.lock:
+            ticket = self._tickets.pop(name, None)
+            if ticket:
+                del self._buckets[ticket.rank_idx][name]
+            return ticket is not None
+
+    def __contains__(self, name):
+        return name in self._tickets
+
+    def __len__(self):
+        return len(self._tickets)
+
+    def waited(self, name):
+        """已等待秒数（不在队列中返回 None）"""
+        ticket = self._tickets.get(name)
+        return time.monotonic() - ticket.joined_at if ticket else None
+
+    def _window(self, ticket, now):
+        widened = int((now - ticket.joined_at) // self.widen_seconds) if self.widen_seconds else 0
+        return min(self.max_window, self.base_window + widened)
+
+    def take_groups(self):
+        """取出所有可成组的玩家。Returns: [[name, ...], ...]"""
+        groups = []
+        now = time.monotonic()
+        with self.lock:
+            self._taken = {}
+            if len(self._tickets) < self.group_size:
+                return groups
+            windows = {name: self._window(t, now) for name, t in self._tickets.items()}
+
+            def compatible(a, b):
+                gap = abs(a.rank_idx - b.rank_idx)
+                return gap <= windows[a.name] and gap <= windows[b.name]
+
+            for anchor in list(self._tickets.values()):
+                if anchor.name not in self._tickets:
+                    continue
+                window = windows[anchor.name]
+                lo = max(0, anchor.rank_idx - window)
+                hi = min(len(self._buckets) - 1, anchor.rank_idx + window)
+                candidates = [
+                    t for idx in range(lo, hi + 1) for t in self._buckets[idx].values()
+                    if t is not anchor and compatible(anchor, t)
+                ]
+                if len(candidates) < self.group_size - 1:
+                    continue
+                candidates.sort(key=lambda t: t.joined_at)
+                group = [anchor]
+                for t in candidates:
+                    if all(compatible(t, m) for m in group[1:]):
+                        group.append(t)
+                        if len(group) == self.group_size:
+                            break
+                if len(group) < self.group_size:
+                    continue
+                for t in group:
+                    del self._tickets[t.name]
+                    del self._buckets[t.rank_idx][t.name]
+                    self._taken[t.name] = t
+                groups.append([t.name for t in group])
+                if len(self._tickets) < self.group_size:
+                    break
+        return groups
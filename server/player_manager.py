@@ -4,12 +4,44 @@
 
 import os
 import json
+import tempfile
+import threading
+import time
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
-from .config import USERS_DIR
+from .config import USERS_DIR, SETTLEMENTS_DIR
 from .user_schema import get_default_user_template, ensure_user_schema, get_rank_name
 
 
+# 结算完成标记保留天数（超过后清理，不再保证幂等）
+_SETTLEMENT_DONE_KEEP_DAYS = 7
+
+_settle_lock = threading.Lock()
+
+
+def _write_json_atomic(path, data, indent=2, sync=False):
+    """先写临时文件再原子替换，避免写到一半留下损坏文件
+
+    临时文件名唯一，同一文件的并发保存互不干扰（后替换者生效）。
+    sync=True 时替换前 fsync（结算日志/提交用），日常存档只做原子替换。
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                    prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
 class PlayerManager:
     """玩家数据管理 - 注册、登录、存档"""
     
@@ -85,13 +117,11 @@ class PlayerManager:
         return template
     
     @staticmethod
-    def _save_user_file(name, data):
+    def _save_user_file(name, data, sync=False):
         """保存用户文件"""
         # 确保目录存在
         os.makedirs(USERS_DIR, exist_ok=True)
-        file_path = PlayerManager._get_user_file(name)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        _write_json_atomic(PlayerManager._get_user_file(name), data, sync=sync)
     
     @staticmethod
     def load_player_data(name):
@@ -117,6 +147,76 @@ class PlayerManager:
             data['password_hash'] = old_data['password_hash']
         PlayerManager._save_user_file(name, data)
 
+    # ── 段位结算事务 ──
+
+    @staticmethod
+    def _settlement_path(match_id, suffix):
+        safe_id = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in str(match_id))
+        return os.path.join(SETTLEMENTS_DIR, f'{safe_id}.{suffix}')
+
+    @staticmethod
+    def settle_match(match_id, updates):
+        """一场对局的结算事务：所有参与者的数据一起提交，按 match_id 幂等
+
+        先把全部玩家的最终文件内容写入一份事务日志（提交点），再逐个原子替换
+        用户文件，最后标记完成。中途崩溃时由 recover_settlements() 重放日志。
+
+        Args:
+            match_id: 对局唯一 ID
+            updates: {player_name: player_data}（不含密码哈希，不会被修改）
+        Returns: True 已提交；False 该对局已结算过
+        """
+        with _settle_lock:
+            journal = PlayerManager._settlement_path(match_id, 'journal')
+            done = PlayerManager._settlement_path(match_id, 'done')
+            if os.path.exists(done) or os.path.exists(journal):
+                return False
+
+            files = {}
+            for name, data in updates.items():
+                merged = dict(data)
+                old_data = PlayerManager._load_user_file(name)
+                if old_data and 'password_hash' in old_data:
+                    merged['password_hash'] = old_data['password_hash']
+                files[name] = merged
+
+            _write_json_atomic(journal, {'match_id': match_id, 'files': files}, indent=None, sync=True)
+            PlayerManager._apply_settlement(journal, done, files)
+            return True
+
+    @staticmethod
+    def _apply_settlement(journal, done, files):
+        for name, data in files.items():
+            PlayerManager._save_user_file(name, data, sync=True)
+        with open(done, 'w', encoding='utf-8'):
+            pass
+        os.remove(journal)
+
+    @staticmethod
+    def recover_settlements():
+        """启动时重放未完成的结算事务，并清理过期的完成标记。Returns: 重放数量"""
+        if not os.path.exists(SETTLEMENTS_DIR):
+            return 0
+        recovered = 0
+        expire_before = time.time() - _SETTLEMENT_DONE_KEEP_DAYS * 86400
+        for filename in os.listdir(SETTLEMENTS_DIR):
+            path = os.path.join(SETTLEMENTS_DIR, filename)
+            if filename.endswith('.journal'):
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        entry = json.load(f)
+                    PlayerManager._apply_settlement(path, path[:-len('journal')] + 'done', entry['files'])
+                    recovered += 1
+                    print(f"[结算恢复] 已重放对局 {entry.get('match_id')} 的结算")
+                except Exception as e:
+                    print(f"[结算恢复] 重放失败 {filename}: {e}")
+            elif filename.endswith('.done') and os.path.getmtime(path) < expire_before:
+                os.remove(path)
+            elif filename.endswith('.tmp'):
+                # 日志未写完即崩溃：事务未提交，直接丢弃
+                os.remove(path)
+        return recovered
+
     @staticmethod
     def rename_player(old_name, new_name):
         """重命名玩家"""
@@ -179,9 +279,9 @@ class PlayerManager:
 
     @staticmethod
     def get_player_rank(name):
-        """获取玩家麻将段位"""
-        data = PlayerManager.load_player_data(name)
-        if data and 'mahjong' in data:
+        """获取玩家麻将段位（只读原始文件，不做模板合并）"""
+        data = PlayerManager._load_user_file(name)
+        if data and isinstance(data.get('mahjong'), dict):
             rank_id = data['mahjong'].get('rank', 'novice_1')
             return rank_id, get_rank_name(rank_id)
         return 'novice_1', '初心一'
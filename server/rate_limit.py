@@ -0,0 +1,90 @@
+"""
+连接级消息限流 — 令牌桶
+
+每个连接持有一个 FloodControl：一个连接总桶（'*'）+ 按消息类型的分桶，
+配额见 config.RATE_LIMITS。消息需同时通过总桶和类型桶才放行。
+"""
+
+import time
+
+from .config import RATE_LIMITS
+
+
+class TokenBucket:
+    """令牌桶：按 rate 每秒补充，最多积攒 capacity 个"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def peek(self, now, cost=1):
+        """是否有足够令牌（不扣除）"""
+        self._refill(now)
+        return self.tokens >= cost
+
+    def consume(self, now, cost=1):
+        """扣除令牌，不足返回 False"""
+        self._refill(now)
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+
+class FloodControl:
+    """单个连接的限流器"""
+
+    # 同一连接两次拒绝提示的最小间隔（秒），避免提示本身被刷屏
+    NOTICE_INTERVAL = 1.0
+
+    def __init__(self, limits=None):
+        limits = limits or RATE_LIMITS
+        self._limits = limits
+        self._total = TokenBucket(*limits['*']) if '*' in limits else None
+        self._buckets = {}  # {msg_type: TokenBucket}，按需创建
+        self.rejected = {}  # {msg_type 或 'other': 被拒绝次数}
+        self._last_notice = 0.0
+
+    def _bucket(self, msg_type):
+        bucket = self._buckets.get(msg_type)
+        if bucket is None and msg_type in self._limits and msg_type != '*':
+            bucket = self._buckets[msg_type] = TokenBucket(*self._limits[msg_type])
+        return bucket
+
+    def allow(self, msg_type):
+        """检查并扣除配额，超限返回 False 并计数"""
+        now = time.monotonic()
+        bucket = self._bucket(msg_type)
+        # 先检查后扣除：类型桶拒绝时不消耗总桶
+        if (bucket is None or bucket.peek(now)) and (self._total is None or self._total.consume(now)):
+            if bucket is not None:
+                bucket.consume(now)
+            return True
+        key = self.stat_key(msg_type)
+        self.rejected[key] = self.rejected.get(key, 0) + 1
+        return False
+
+    def stat_key(self, msg_type):
+        """统计用的类型名：未配置配额的类型（客户端可任意构造）统一计为 'other'"""
+        return msg_type if msg_type in self._limits and msg_type != '*' else 'other'
+
+    def should_notify(self):
+        """是否需要向客户端发送拒绝提示（节流）"""
+        now = time.monotonic()
+        if now - self._last_notice >= self.NOTICE_INTERVAL:
+            self._last_notice = now
+            return True
+        return False
+
+    def total_rejected(self):
+        return sum(self.rejected.values())
@@ -0,0 +1,36 @@
+"""
+静态文本渲染缓存 — 帮助 / 游戏列表 / 图鉴目录等
+
+缓存内容只依赖注册表（游戏、位置、头衔、物品），
+register_game() 注册完成后调用 invalidate() 整体失效。
+部分 key 含玩家输入（如帮助页码），按 LRU 限制条目数。
+"""
+
+import threading
+from collections import OrderedDict
+
+_MAX_ENTRIES = 256
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_or_render(key, render):
+    """按 key 取缓存，未命中时调用 render() 生成并缓存"""
+    with _lock:
+        value = _cache.get(key)
+        if value is not None:
+            _cache.move_to_end(key)
+            return value
+    value = render()
+    with _lock:
+        _cache[key] = value
+        if len(_cache) > _MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return value
+
+
+def invalidate():
+    """清空全部渲染缓存"""
+    with _lock:
+        _cache.clear()
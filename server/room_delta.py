@@ -0,0 +1,168 @@
+"""
+房间状态增量协议 — 带序号的快照 + 补丁
+
+每个房间（按 (游戏, room_id) 区分）维护单调递增的 seq 和最新快照。
+分发 room_update 时，对已持有上一版本（seq - 1）的客户端只发送补丁：
+  {'type': 'room_delta', 'game': ..., 'room_id': ..., 'base_seq': n-1, 'seq': n, 'patch': [...]}
+其他客户端（刚进房、重连、发现断档）收到完整快照：
+  {'type': 'room_update', 'room_data': {...}, 'seq': n, ...}
+客户端发现 base_seq 与本地 seq 不一致时发送 {'type': 'room_resync', 'game', 'room_id'} 请求完整快照。
+
+补丁格式（按顺序应用，见 apply_patch）:
+  [path, value] — 设置 path 处的值（path 为键/下标列表，[] 表示整体替换）
+  [path]        — 删除 path 处的键
+列表长度不变时逐元素比较，长度变化时整体替换该列表。
+
+同一版本的快照/补丁消息只编码一次（SharedMessage），所有接收者复用。
+快照按值比较判断是否更新并保存副本，引擎原地修改后返回同一对象也能正确生成补丁。
+"""
+
+import copy
+import json
+import threading
+import time
+
+from .game_protocol import SharedMessage
+
+_MISSING = object()
+
+
+def diff_state(old, new, path=(), ops=None):
+    """计算 old → new 的补丁。Returns: 补丁操作列表"""
+    if ops is None:
+        ops = []
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key, value in new.items():
+            old_value = old.get(key, _MISSING)
+            if old_value is _MISSING:
+                ops.append([list(path) + [key], value])
+            elif old_value != value:
+                diff_state(old_value, value, path + (key,), ops)
+        for key in old:
+            if key not in new:
+                ops.append([list(path) + [key]])
+    elif isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        for i, (a, b) in enumerate(zip(old, new)):
+            if a != b:
+                diff_state(a, b, path + (i,), ops)
+    else:
+        ops.append([list(path), new])
+    return ops
+
+
+def apply_patch(state, ops):
+    """应用补丁（客户端逻辑的参考实现）。Returns: 新状态"""
+    for op in ops:
+        path = op[0]
+        if not path:
+            state = op[1]
+            continue
+        target = state
+        for key in path[:-1]:
+            target = target[key]
+        if len(op) == 1:
+            target.pop(path[-1], None)
+        else:
+            target[path[-1]] = op[1]
+    return state
+
+
+class _RoomLog:
+    """单个房间的版本记录"""
+
+    __slots__ = ('seq', 'snapshot', 'patch', 'messages', 'last_used')
+
+    def __init__(self):
+        self.seq = 0
+        self.snapshot = None
+        self.patch = None       # 上一版本 → 当前版本的补丁，None 表示只能发完整快照
+        self.messages = {}      # 当前版本已编码的消息 {(kind, 附加字段): SharedMessage}
+        self.last_used = time.monotonic()
+
+    def advance(self, room_data):
+        # 保存副本：引擎可能继续原地修改 room_data（补丁中的值也引用副本）
+        room_data = copy.deepcopy(room_data)
+        if self.snapshot is not None:
+            patch = diff_state(self.snapshot, room_data)
+            # 整体替换时补丁没有意义
+            self.patch = None if any(not op[0] for op in patch) else patch
+        self.snapshot = room_data
+        self.seq += 1
+        self.messages = {}
+
+
+class RoomDeltaTracker:
+    """所有房间的版本记录（线程安全）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._logs = {}  # {(game, room_id): _RoomLog}
+
+    def message_for(self, key, payload, client_seq):
+        """把一条 room_update 转换为该客户端应收到的消息
+
+        Args:
+            key: (game, room_id)
+            payload: 原 room_update 消息（含 room_data，可附带 message 等字段）
+            client_seq: 该客户端已持有的 seq（没有为 None）
+        Returns: (SharedMessage, 客户端新的 seq)
+        """
+        with self.lock:
+            log = self._logs.get(key)
+            if log is None:
+                log = self._logs[key] = _RoomLog()
+            room_data = payload['room_data']
+            if log.snapshot is None or room_data != log.snapshot:
+                log.advance(room_data)
+            log.last_used = time.monotonic()
+
+            if client_seq == log.seq:
+                kind = 'same'
+            elif client_seq == log.seq - 1 and log.patch is not None:
+                kind = 'delta'
+            else:
+                kind = 'full'
+            extras = {k: v for k, v in payload.items() if k not in ('type', 'room_data')}
+            cache_key = (kind, json.dumps(extras, sort_keys=True) if extras else '')
+            msg = log.messages.get(cache_key)
+            if msg is None:
+                msg = log.messages[cache_key] = self._build(key, log, kind, extras)
+            return msg, log.seq
+
+    def resync(self, key):
+        """完整快照（客户端请求重同步）。Returns: (SharedMessage, seq)，房间未知时 None"""
+        with self.lock:
+            log = self._logs.get(key)
+            if log is None or log.snapshot is None:
+                return None
+            msg = log.messages.get(('full', ''))
+            if msg is None:
+                msg = log.messages[('full', '')] = self._build(key, log, 'full', {})
+            return msg, log.seq
+
+    def _build(self, key, log, kind, extras):
+        if kind == 'full':
+            payload = {'type': 'room_update', **extras, 'room_data': log.snapshot, 'seq': log.seq}
+        else:
+            game, room_id = key
+            payload = {
+                'type': 'room_delta', **extras, 'game': game, 'room_id': room_id,
+                'base_seq': log.seq if kind == 'same' else log.seq - 1,
+                'seq': log.seq,
+                'patch': [] if kind == 'same' else log.patch,
+            }
+        msg = SharedMessage(payload)
+        msg.prepared = True
+        return msg
+
+    def evict_idle(self, idle_seconds):
+        """回收长时间没有更新的房间记录（房间已关闭）。Returns: 回收数量"""
+        deadline = time.monotonic() - idle_seconds
+        with self.lock:
+            stale = [k for k, log in self._logs.items() if log.last_used < deadline]
+            for k in stale:
+                del self._logs[k]
+        return len(stale)
+
+    def __len__(self):
+        return len(self._logs)
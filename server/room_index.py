@@ -0,0 +1,101 @@
+"""
+房间索引 — 按 (状态, 场次类型, 空位数) 分桶，房间列表分页查询
+
+房间状态/人数变化时由 BaseRoomCommandHandler._reindex_room() 更新，
+关闭时 _unindex_room() 移除。分页查询按桶大小整桶跳过，只取出当前页的房间，
+因此列表开销取决于页大小而不是房间总数。
+每次变更递增 version，供调用方缓存渲染结果。
+"""
+
+from itertools import islice
+
+# 桶排序：等待中在前；同状态内有空位且快满员的在前，满员的最后
+_STATE_ORDER = {'waiting': 0, 'playing': 1}
+
+
+def _bucket_sort_key(key):
+    state, match_type, free = key
+    return (_STATE_ORDER.get(state, 2), free == 0, free, str(match_type))
+
+
+class RoomIndex:
+    """房间分桶索引（非线程安全，由引擎调用方串行访问）"""
+
+    def __init__(self):
+        self._keys = {}      # {room_id: (state, match_type, free)}
+        self._buckets = {}   # {(state, match_type, free): {room_id: room}}（插入序）
+        self._order = []     # 排好序的桶 key 列表
+        self._order_dirty = False
+        self.version = 0
+
+    def update(self, room, free):
+        """登记/更新房间（free = 空位数）"""
+        room_id = room.room_id
+        key = (room.state, room.match_type, free)
+        old = self._keys.get(room_id)
+        if old != key:
+            if old is not None:
+                self._drop(room_id, old)
+            if key not in self._buckets:
+                self._buckets[key] = {}
+                self._order_dirty = True
+            self._keys[room_id] = key
+        self._buckets[key][room_id] = room
+        self.version += 1
+
+    def remove(self, room_id):
+        key = self._keys.pop(room_id, None)
+        if key is not None:
+            self._drop(room_id, key)
+            self.version += 1
+
+    def _drop(self, room_id, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return
+        bucket.pop(room_id, None)
+        if not bucket:
+            del self._buckets[key]
+            self._order_dirty = True
+
+    def _matching(self, state=None, match_type=None, min_free=0):
+        """符合条件的桶（有序）"""
+        if self._order_dirty:
+            self._order = sorted(self._buckets, key=_bucket_sort_key)
+            self._order_dirty = False
+        for key in self._order:
+            s, m, free = key
+            if state is not None and s != state:
+                continue
+            if match_type is not None and m != match_type:
+                continue
+            if free < min_free:
+                continue
+            yield self._buckets[key]
+
+    def count(self, state=None, match_type=None, min_free=0):
+        return sum(len(b) for b in self._matching(state, match_type, min_free))
+
+    def page(self, page, page_size, state=None, match_type=None, min_free=0):
+        """分页查询（page 从 1 开始）。Returns: (rooms, total)"""
+        offset = max(0, page - 1) * page_size
+        rooms = []
+        total = 0
+        for bucket in self._matching(state, match_type, min_free):
+            size = len(bucket)
+            total += size
+            if len(rooms) >= page_size:
+                continue
+            if offset >= size:
+                offset -= size
+                continue
+            take = page_size - len(rooms)
+            rooms.extend(islice(bucket.values(), offset, offset + take))
+            offset = 0
+        return rooms, total
+
+    def __contains__(self, room_id):
+        return room_id in self._keys
+
+    def __len__(self):
+        return len(self._keys)
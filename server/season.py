@@ -0,0 +1,195 @@
+"""
+赛季结算离线工具 — 段位衰减 / 软重置 / 赛季奖励（NumPy 向量化）
+
+用法（停服后运行）:
+    python -m server.season --season 2025S1 --game mahjong [--game chess] [--dry-run]
+
+流程:
+  1. 并发读取 USERS_DIR 下全部用户文件原始数据，抽取段位、段位点、本赛季局数为列数组
+  2. 按 user_schema 的段位表（rank_order / tier / points_up）向量化计算:
+     - 软重置: 段位下降 SEASON_RESET_DROP 级；本赛季未打段位场再降 SEASON_INACTIVE_DROP 级
+       （没有 season_games 记录的账号无法判断是否活跃，不追加衰减）
+       保底: tier 1/2 不跌出本 tier，tier > 2 最多跌到上一 tier 的最低段
+     - 段位点: 掉段者取新段位 points_up // 2，未掉段者保留 SEASON_POINTS_KEEP 比例
+     - 奖励: 按赛季末 tier 发放 SEASON_TIER_GOLD 金币
+  3. 只写回有变化的文件（并发原子替换），并重建所处理游戏的排行榜文件
+
+每个账号的游戏数据记录 last_season，同一赛季重复运行会跳过已处理的账号。
+需要 numpy（pip install numpy），服务器运行本身不依赖。
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:  # 仅离线工具需要
+    np = None
+
+from .config import (
+    USERS_DIR, LEADERBOARD_DIR, SEASON_RESET_DROP, SEASON_INACTIVE_DROP, SEASON_POINTS_KEEP, SEASON_TIER_GOLD,
+)
+from .leaderboard import Leaderboard
+from .player_manager import _write_json_atomic
+from .user_schema import get_rank_table
+
+
+def _read_user(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"[赛季] 跳过无法读取的文件 {os.path.basename(path)}: {e}")
+        return None
+
+
+def load_users(users_dir=USERS_DIR, workers=8):
+    """并发读取全部用户原始数据。Returns: {player_name: data}"""
+    names = [f[:-5] for f in os.listdir(users_dir) if f.endswith('.json')]
+    paths = [os.path.join(users_dir, f'{n}.json') for n in names]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        datas = list(pool.map(_read_user, paths))
+    return {n: d for n, d in zip(names, datas) if d is not None}
+
+
+def _rank_arrays(table):
+    """段位表 → 按段位序号索引的数组: tier, 保底序号, 降段后段位点, 段位点上限"""
+    order = table.order
+    tiers = np.array([table.ranks[r]['tier'] for r in order], dtype=np.int32)
+    first_of_tier = {}
+    for i, t in enumerate(tiers.tolist()):
+        first_of_tier.setdefault(t, i)
+    floor = np.array([
+        first_of_tier.get(t - 1, first_of_tier[t]) if t > 2 else first_of_tier[t]
+        for t in tiers.tolist()
+    ], dtype=np.int32)
+    points_up = np.array([
+        table.ranks[r].get('points_up') or np.iinfo(np.int32).max for r in order
+    ], dtype=np.int64)
+    half_up = np.array([(table.ranks[r].get('points_up') or 0) // 2 for r in order], dtype=np.int64)
+    return tiers, floor, points_up, half_up
+
+
+def compute_season(table, rank_idx, points, season_games):
+    """向量化赛季规则
+
+    Args: 段位序号 / 段位点 / 本赛季段位场局数（等长 int 数组，-1 表示未统计）
+    Returns: (新段位序号, 新段位点, 奖励金币)
+    """
+    tiers, floor, points_up, half_up = _rank_arrays(table)
+    gold_by_tier = np.zeros(int(tiers.max()) + 1, dtype=np.int64)
+    for tier, gold in SEASON_TIER_GOLD.items():
+        if tier < len(gold_by_tier):
+            gold_by_tier[tier] = gold
+
+    # 只对确认 0 局的账号追加衰减；未统计局数（-1，如字段上线前的老账号）不视为不活跃
+    drop = SEASON_RESET_DROP + SEASON_INACTIVE_DROP * (season_games == 0)
+    new_idx = np.maximum(rank_idx - drop, floor[rank_idx])
+    # 保底序号可能高于当前段位（本 tier 内已是最低段），不能因此升段
+    new_idx = np.minimum(new_idx, rank_idx)
+    demoted = new_idx < rank_idx
+
+    kept = (points * SEASON_POINTS_KEEP).astype(np.int64)
+    new_points = np.where(demoted, half_up[new_idx], kept)
+    new_points = np.minimum(new_points, points_up[new_idx] - 1).clip(min=0)
+
+    rewards = gold_by_tier[tiers[rank_idx]]
+    return new_idx, new_points, rewards
+
+
+def run_season(season_id, game_ids, users_dir=USERS_DIR, dry_run=False, workers=8):
+    """执行赛季结算。Returns: {game_id: 处理账号数}"""
+    users = load_users(users_dir, workers)
+    changed = set()
+    summary = {}
+
+    for game_id in game_ids:
+        table = get_rank_table(game_id)
+        names, idx, pts, games = [], [], [], []
+        for name, data in users.items():
+            game_data = data.get(game_id)
+            if not isinstance(game_data, dict) or 'rank' not in game_data:
+                continue
+            if (game_data.get('last_season') or {}).get('season') == season_id:
+                continue
+            names.append(name)
+            idx.append(table.rank_index(game_data['rank']))
+            pts.append(game_data.get('rank_points', 0))
+            games.append(game_data.get('season_games', -1))
+
+        summary[game_id] = len(names)
+        if not names:
+            continue
+
+        new_idx, new_pts, rewards = compute_season(
+            table, np.array(idx, dtype=np.int32), np.array(pts, dtype=np.int64),
+            np.array(games, dtype=np.int32))
+
+        demoted = int((new_idx < np.array(idx)).sum())
+        print(f"[赛季] {game_id}: {len(names)} 个账号，掉段 {demoted} 个，"
+              f"发放金币 {int(rewards.sum())}")
+
+        for name, old_i, new_i, new_p, gold in zip(
+                names, idx, new_idx.tolist(), new_pts.tolist(), rewards.tolist()):
+            data = users[name]
+            game_data = data[game_id]
+            game_data['last_season'] = {
+                'season': season_id,
+                'rank': game_data['rank'],
+                'rank_points': game_data.get('rank_points', 0),
+            }
+            game_data['rank'] = table.order[new_i]
+            game_data['rank_points'] = int(new_p)
+            game_data['season_games'] = 0
+            if gold:
+                data['gold'] = data.get('gold', 0) + int(gold)
+            changed.add(name)
+
+    if dry_run:
+        print(f"[赛季] 预演模式，未写回（{len(changed)} 个文件将被修改）")
+        return summary
+
+    def _write(name):
+        _write_json_atomic(os.path.join(users_dir, f'{name}.json'), users[name])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(_write, changed))
+    print(f"[赛季] 已写回 {len(changed)} 个用户文件")
+
+    # 段位已整体变化，按新数据重建排行榜索引
+    for game_id, count in summary.items():
+        if count:
+            board = Leaderboard(game_id, os.path.join(LEADERBOARD_DIR, f'{game_id}.json'))
+            board.rebuild_from_users(users_dir)
+            board.save()
+            print(f"[赛季] 已重建 {game_id} 排行榜（{len(board)} 人）")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='赛季结算（停服后运行）')
+    parser.add_argument('--season', required=True, help='赛季 ID（重复运行同一赛季会跳过已处理账号）')
+    parser.add_argument('--game', action='append', required=True, help='游戏 ID，可多次指定')
+    parser.add_argument('--dry-run', action='store_true', help='只计算不写回')
+    parser.add_argument('--workers', type=int, default=8, help='读写线程数')
+    args = parser.parse_args(argv)
+
+    if np is None:
+        print("赛季工具需要 numpy: pip install numpy")
+        return 1
+
+    # 懒注册的游戏需先加载，段位表才会注册
+    from games import GAMES, is_game_loaded, load_game
+    for game_id in args.game:
+        if game_id in GAMES and not is_game_loaded(game_id):
+            load_game(game_id)
+
+    run_season(args.season, args.game, dry_run=args.dry_run, workers=args.workers)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
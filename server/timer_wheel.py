@@ -0,0 +1,229 @@
+"""
+定时轮 — 框架统一的延时任务调度（分层时间轮 + 工作线程池）
+
+分层时间轮：TIMER_WHEEL_LEVELS 层、每层 TIMER_WHEEL_SLOTS 个槽，第 0 层每槽一个 tick。
+定时器按到期 tick 放入能容纳其剩余时长的最低一层；高层槽位到点时整体下放（cascade）。
+插入、取消、每 tick 推进均为 O(1)（下放摊还），全进程只有一个轮线程。
+最长延时 TIMER_WHEEL_TICK * TIMER_WHEEL_SLOTS ** TIMER_WHEEL_LEVELS 秒，超出按最长处理。
+
+到期回调交给 TIMER_WHEEL_WORKERS 个工作线程执行，慢回调不会拖慢轮的推进。
+每个工作线程一条队列：带 key 的定时器按 key 哈希固定到同一线程，同一房间的回调按到期顺序串行执行；
+不带 key 的轮流分配。
+定时器可带 key（如 (game_id, room_id)），cancel_key() 一次取消该 key 下全部定时器。
+metrics() 提供回调延迟（实际执行时间 - 应执行时间）与队列积压等指标。
+"""
+
+import queue
+import threading
+import time
+
+from .config import TIMER_WHEEL_TICK, TIMER_WHEEL_SLOTS, TIMER_WHEEL_LEVELS, TIMER_WHEEL_WORKERS
+
+
+class TimerHandle:
+    """定时器句柄（cancel 用）"""
+
+    __slots__ = ('callback', 'args', 'expires', 'due', 'key', 'level', 'slot', 'cancelled')
+
+    def __init__(self, callback, args, expires, due, key):
+        self.callback = callback
+        self.args = args
+        self.expires = expires  # 到期 tick
+        self.due = due          # 应执行的 monotonic 时间
+        self.key = key
+        self.level = 0
+        self.slot = 0
+        self.cancelled = False
+
+
+class TimerWheel:
+    """分层时间轮"""
+
+    def __init__(self, tick=TIMER_WHEEL_TICK, slots=TIMER_WHEEL_SLOTS,
+                 levels=TIMER_WHEEL_LEVELS, workers=TIMER_WHEEL_WORKERS):
+        self.tick = tick
+        self.slot_count = slots
+        self.levels = levels
+        self.max_ticks = slots ** levels - 1
+        self.wheels = [[set() for _ in range(slots)] for _ in range(levels)]
+        self.current = 0          # 已推进的 tick 数
+        self.lock = threading.Lock()
+        self.running = False
+        self.worker_count = workers
+        self._started_at = None
+        self._thread = None
+        self._queues = [queue.Queue() for _ in range(max(1, workers))]
+        self._next_queue = 0      # 不带 key 的回调轮流分配
+        self._by_key = {}         # {key: {TimerHandle}}
+        self._pending = 0
+        # 指标
+        self._fired = 0
+        self._lag_max = 0.0
+        self._lag_avg = 0.0
+        self._tick_lag = 0.0
+
+    # ── 插入 / 取消 ──
+
+    def _place(self, handle):
+        """按剩余 tick 放入合适层级（需持锁调用）"""
+        delta = handle.expires - self.current
+        n = self.slot_count
+        if delta <= 0:
+            level, slot = 0, self.current % n
+        else:
+            level, span = 0, 1
+            while level < self.levels - 1 and delta >= span * n:
+                level += 1
+                span *= n
+            slot = (handle.expires // span) % n
+        handle.level = level
+        handle.slot = slot
+        self.wheels[level][slot].add(handle)
+
+    def schedule(self, delay, callback, *args, key=None):
+        """delay 秒后执行 callback(*args)。Returns: TimerHandle"""
+        ticks = min(self.max_ticks, max(1, int(round(delay / self.tick))))
+        with self.lock:
+            handle = TimerHandle(callback, args, self.current + ticks,
+                                 time.monotonic() + delay, key)
+            self._place(handle)
+            self._pending += 1
+            if key is not None:
+                self._by_key.setdefault(key, set()).add(handle)
+        return handle
+
+    def _discard(self, handle):
+        """从轮和 key 索引中移除（需持锁调用）"""
+        handle.cancelled = True
+        bucket = self.wheels[handle.level][handle.slot]
+        if handle in bucket:
+            bucket.discard(handle)
+            self._pending -= 1
+        if handle.key is not None:
+            keyed = self._by_key.get(handle.key)
+            if keyed:
+                keyed.discard(handle)
+                if not keyed:
+                    del self._by_key[handle.key]
+
+    def cancel(self, handle):
+        """取消定时器（已触发或已取消时无副作用）"""
+        if handle is None or handle.cancelled:
+            return
+        with self.lock:
+            self._discard(handle)
+
+    def cancel_key(self, key):
+        """取消 key 下的全部定时器（如房间关闭）。Returns: 取消数量"""
+        with self.lock:
+            handles = list(self._by_key.get(key, ()))
+            for handle in handles:
+                self._discard(handle)
+        return len(handles)
+
+    # ── 推进 ──
+
+    def _advance(self):
+        """推进一格：高层槽位到点时下放，返回第 0 层到期的定时器"""
+        n = self.slot_count
+        with self.lock:
+            self.current += 1
+            t = self.current
+            span = n ** (self.levels - 1)
+            for level in range(self.levels - 1, 0, -1):
+                if t % span == 0:
+                    idx = (t // span) % n
+                    bucket = self.wheels[level][idx]
+                    self.wheels[level][idx] = set()
+                    for handle in bucket:
+                        self._place(handle)
+                span //= n
+            idx = t % n
+            due = [h for h in self.wheels[0][idx] if h.expires <= t]
+            for handle in due:
+                self._discard(handle)
+        return due
+
+    def _run(self):
+        while self.running:
+            target = self._started_at + (self.current + 1) * self.tick
+            delay = target - time.monotonic()
+            self._tick_lag = max(0.0, -delay)
+            if delay > 0:
+                time.sleep(delay)
+            for handle in sorted(self._advance(), key=lambda h: h.due):
+                self._dispatch(handle)
+
+    def _dispatch(self, handle):
+        """同一 key 的回调总是进入同一工作线程的队列"""
+        if handle.key is not None:
+            index = hash(handle.key) % len(self._queues)
+        else:
+            index = self._next_queue
+            self._next_queue = (index + 1) % len(self._queues)
+        self._queues[index].put(handle)
+
+    def _work(self, tasks):
+        while True:
+            handle = tasks.get()
+            if handle is None:
+                return
+            lag = max(0.0, time.monotonic() - handle.due)
+            self._fired += 1
+            self._lag_avg += (lag - self._lag_avg) * 0.05
+            if lag > self._lag_max:
+                self._lag_max = lag
+            try:
+                handle.callback(*handle.args)
+            except Exception as e:
+                print(f"[定时轮] 回调异常: {e}")
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._started_at = time.monotonic() - self.current * self.tick
+        self._thread = threading.Thread(target=self._run, name='timer-wheel')
+        self._thread.daemon = True
+        self._thread.start()
+        for i, tasks in enumerate(self._queues):
+            worker = threading.Thread(target=self._work, args=(tasks,), name=f'timer-worker-{i}')
+            worker.daemon = True
+            worker.start()
+
+    def stop(self):
+        self.running = False
+        for tasks in self._queues:
+            tasks.put(None)
+
+    # ── 指标 ──
+
+    def pending_count(self):
+        return self._pending
+
+    def metrics(self):
+        """Returns: {pending, queued, fired, lag_avg, lag_max, tick_lag}（秒）"""
+        return {
+            'pending': self._pending,
+            'queued': sum(q.qsize() for q in self._queues),
+            'fired': self._fired,
+            'lag_avg': round(self._lag_avg, 4),
+            'lag_max': round(self._lag_max, 4),
+            'tick_lag': round(self._tick_lag, 4),
+        }
+
+
+_wheel = None
+_wheel_lock = threading.Lock()
+
+
+def get_timer_wheel():
+    """进程共享的定时轮（首次调用时启动轮线程与工作线程）"""
+    global _wheel
+    if _wheel is None:
+        with _wheel_lock:
+            if _wheel is None:
+                wheel = TimerWheel()
+                wheel.start()
+                _wheel = wheel
+    return _wheel
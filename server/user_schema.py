@@ -13,7 +13,9 @@
 均由 register_game() 自动加载。
 """
 
+from dataclasses import dataclass
 from datetime import datetime
+from types import MappingProxyType
 import copy
 import json
 import os
@@ -52,6 +54,69 @@ ITEM_SOURCES = _items_data['sources']
 _GAME_PLAYER_DEFAULTS = {}   # {game_id: {默认玩家数据}}
 _RANK_TO_TITLE = {}           # {rank_id: title_id}
 _GAME_RANKS = {}              # {game_id: {'ranks': {...}, 'rank_order': [...]}}
+_RANK_TABLES = {}             # {game_id: RankTable}
+
+
+# ══════════════════════════════════════════════════
+#  段位查询表（注册时预计算，只读）
+# ══════════════════════════════════════════════════
+
+@dataclass(frozen=True)
+class RankTable:
+    """单个段位体系的预计算查询表
+
+    结算与段位门槛只做字典读取：
+      index        — {rank_id: 序号}
+      next_rank    — {rank_id: 上一段（升段目标），最高段为 None}
+      demote_to    — {rank_id: 降段目标}，按段位规则不可降段时为 None
+                     （tier > 2 可降；tier == 2 仅可降到同为 tier 2 的段位）
+      demote_points — {rank_id: 降段后的段位点（目标段 points_up // 2）}
+    """
+    order: tuple
+    ranks: MappingProxyType
+    index: MappingProxyType
+    next_rank: MappingProxyType
+    demote_to: MappingProxyType
+    demote_points: MappingProxyType
+
+    @classmethod
+    def build(cls, ranks: dict, rank_order: list) -> 'RankTable':
+        order = tuple(rank_order)
+        next_rank, demote_to, demote_points = {}, {}, {}
+        for i, rank_id in enumerate(order):
+            info = ranks[rank_id]
+            next_rank[rank_id] = order[i + 1] if i + 1 < len(order) else None
+            target = None
+            if i > 0:
+                prev = order[i - 1]
+                tier, prev_tier = info['tier'], ranks[prev]['tier']
+                if tier > 2 or (tier == 2 and prev_tier == 2):
+                    target = prev
+                    demote_points[rank_id] = ranks[prev].get('points_up', 40) // 2
+            demote_to[rank_id] = target
+        return cls(
+            order=order,
+            ranks=MappingProxyType(dict(ranks)),
+            index=MappingProxyType({r: i for i, r in enumerate(order)}),
+            next_rank=MappingProxyType(next_rank),
+            demote_to=MappingProxyType(demote_to),
+            demote_points=MappingProxyType(demote_points),
+        )
+
+    @property
+    def lowest(self) -> str:
+        return self.order[0]
+
+    def info(self, rank_id: str) -> dict:
+        """段位信息（未知段位按最低段处理）"""
+        info = self.ranks.get(rank_id)
+        return info if info is not None else self.ranks[self.order[0]]
+
+    def rank_index(self, rank_id: str) -> int:
+        return self.index.get(rank_id, 0)
+
+
+_DEFAULT_RANK_TABLE = RankTable.build(RANKS, RANK_ORDER)
 
 
 # ══════════════════════════════════════════════════
@@ -85,28 +150,24 @@ def register_rank_titles(mapping: dict) -> None:
 def register_game_ranks(game_id: str, ranks: dict, rank_order: list) -> None:
     """注入游戏专属段位体系（覆盖框架默认）"""
     _GAME_RANKS[game_id] = {'ranks': ranks, 'rank_order': rank_order}
+    _RANK_TABLES[game_id] = RankTable.build(ranks, rank_order)
 
 
 # ══════════════════════════════════════════════════
 #  段位查询（支持 game_type 切换段位体系）
 # ══════════════════════════════════════════════════
 
-def _get_ranks(game_type=None):
-    if game_type and game_type in _GAME_RANKS:
-        return _GAME_RANKS[game_type]['ranks']
-    return RANKS
+def get_rank_table(game_type=None):
+    """段位查询表（未注册专属段位的游戏使用框架默认）"""
+    return _RANK_TABLES.get(game_type, _DEFAULT_RANK_TABLE)
 
 
 def get_rank_order(game_type=None):
-    if game_type and game_type in _GAME_RANKS:
-        return _GAME_RANKS[game_type]['rank_order']
-    return RANK_ORDER
+    return get_rank_table(game_type).order
 
 
 def get_rank_info(rank_id, game_type=None):
-    ranks = _get_ranks(game_type)
-    order = get_rank_order(game_type)
-    return ranks.get(rank_id, ranks[order[0]])
+    return get_rank_table(game_type).info(rank_id)
 
 
 def get_rank_name(rank_id, game_type=None):
@@ -114,18 +175,14 @@ def get_rank_name(rank_id, game_type=None):
 
 
 def get_rank_index(rank_id, game_type=None):
-    order = get_rank_order(game_type)
-    try:
-        return order.index(rank_id)
-    except ValueError:
-        return 0
+    return get_rank_table(game_type).index.get(rank_id, 0)
 
 
 def calculate_rank_change(current_rank, points_change, game_type=None):
     """计算段位变化。Returns: (new_rank, new_points, promoted, demoted)"""
-    rank_info = get_rank_info(current_rank, game_type)
-    rank_idx = get_rank_index(current_rank, game_type)
-    order = get_rank_order(game_type)
+    table = get_rank_table(game_type)
+    rank_info = table.info(current_rank)
+    key = current_rank if current_rank in table.index else table.lowest
 
     new_points = max(0, points_change)
     promoted = False
@@ -133,19 +190,15 @@ def calculate_rank_change(current_rank, points_change, game_type=None):
     new_rank = current_rank
 
     if rank_info['points_up'] is not None and new_points >= rank_info['points_up']:
-        if rank_idx < len(order) - 1:
-            new_rank = order[rank_idx + 1]
+        if table.next_rank[key]:
+            new_rank = table.next_rank[key]
             new_points = 0
             promoted = True
     elif rank_info['points_down'] is not None and new_points < rank_info['points_down']:
-        if rank_idx > 0:
-            prev_rank = order[rank_idx - 1]
-            prev_tier = get_rank_info(prev_rank, game_type)['tier']
-            current_tier = rank_info['tier']
-            if current_tier > 2 or (current_tier == 2 and prev_tier == 2):
-                new_rank = prev_rank
-                new_points = get_rank_info(new_rank, game_type)['points_up'] // 2
-                demoted = True
+        if table.demote_to[key]:
+            new_rank = table.demote_to[key]
+            new_points = table.demote_points[key]
+            demoted = True
 
     return new_rank, new_points, promoted, demoted
 
@@ -0,0 +1,176 @@
+"""
+聊天违禁词过滤 — Aho–Corasick 多模式自动机
+
+词表来自 server/banned_words.json（与 commands.json 同目录），按处理动作分组：
+  - reject — 拒绝发送
+  - mask   — 命中部分替换为 replacement 字符
+  - log    — 放行，仅记录日志
+
+每条消息单次扫描即可找出全部命中；同时命中多类时取最严格的动作。
+匹配前逐字符做 NFKC + 小写归一（全角/半角、大小写不敏感），CJK 文本原样参与匹配。
+词表文件修改后由 reload_if_changed() 热加载。
+"""
+
+import json
+import os
+import unicodedata
+from collections import deque
+
+from .config import BANNED_WORDS_FILE
+
+# 动作严重程度（数值越大越严格）
+ACTION_PASS = 0
+ACTION_LOG = 1
+ACTION_MASK = 2
+ACTION_REJECT = 3
+
+_ACTION_NAMES = {'log': ACTION_LOG, 'mask': ACTION_MASK, 'reject': ACTION_REJECT}
+
+_fold_cache = {}
+
+
+def _fold(ch):
+    """单字符归一化，保证一对一映射（结果不是单字符时保留原字符）"""
+    folded = _fold_cache.get(ch)
+    if folded is None:
+        folded = unicodedata.normalize('NFKC', ch).lower()
+        if len(folded) != 1:
+            folded = ch
+        if len(_fold_cache) < 65536:
+            _fold_cache[ch] = folded
+    return folded
+
+
+class _Automaton:
+    """编译后的只读自动机：goto 表 + fail 链 + 输出 [(词长, 动作)]"""
+
+    __slots__ = ('goto', 'fail', 'out')
+
+    def __init__(self, words):
+        goto = [{}]
+        out = [[]]
+        for word, action in words.items():
+            node = 0
+            for ch in word:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                node = nxt
+            out[node].append((len(word), action))
+
+        # BFS 构建 fail 链，并把后缀节点的输出合并进来
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in goto[node].items():
+                queue.append(nxt)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0) if goto[f].get(ch, 0) != nxt else 0
+                out[nxt].extend(out[fail[nxt]])
+
+        self.goto = goto
+        self.fail = fail
+        self.out = [tuple(o) for o in out]
+
+    def scan(self, text):
+        """单次扫描。Returns: [(起始下标, 结束下标, 动作), ...]"""
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        hits = []
+        for i, ch in enumerate(text):
+            ch = _fold(ch)
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                for length, action in out[node]:
+                    hits.append((i + 1 - length, i + 1, action))
+        return hits
+
+
+class FilterResult:
+    """过滤结果"""
+
+    __slots__ = ('action', 'text', 'words')
+
+    def __init__(self, action, text, words):
+        self.action = action  # ACTION_*
+        self.text = text      # 处理后的文本（mask 时已替换）
+        self.words = words    # 命中的原文片段列表
+
+    @property
+    def rejected(self):
+        return self.action == ACTION_REJECT
+
+
+class WordFilter:
+    """可热加载的违禁词过滤器"""
+
+    def __init__(self, path=BANNED_WORDS_FILE):
+        self.path = path
+        self.replacement = '*'
+        self._automaton = None
+        self._mtime = None
+        self.reload()
+
+    def reload(self):
+        """重新编译词表。文件不存在时清空过滤器"""
+        words = {}
+        replacement = '*'
+        mtime = None
+        if os.path.exists(self.path):
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            replacement = data.get('replacement', '*') or '*'
+            # 同一个词出现在多组时取最严格的动作
+            for name, action in sorted(_ACTION_NAMES.items(), key=lambda kv: kv[1]):
+                for word in data.get(name, []):
+                    word = ''.join(_fold(ch) for ch in word.strip())
+                    if word:
+                        words[word] = action
+
+        self._automaton = _Automaton(words) if words else None
+        self.replacement = replacement
+        self._mtime = mtime
+        return len(words)
+
+    def reload_if_changed(self):
+        """词表文件变更时热加载。Returns: 是否重新加载"""
+        mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        if mtime == self._mtime:
+            return False
+        try:
+            count = self.reload()
+            print(f"[违禁词] 词表已重新加载: {count} 个")
+        except Exception as e:
+            print(f"[违禁词] 词表加载失败: {e}")
+            self._mtime = mtime
+        return True
+
+    def check(self, text):
+        """检查并处理一条消息"""
+        automaton = self._automaton
+        if not automaton or not text:
+            return FilterResult(ACTION_PASS, text, [])
+
+        hits = automaton.scan(text)
+        if not hits:
+            return FilterResult(ACTION_PASS, text, [])
+
+        action = max(h[2] for h in hits)
+        words = [text[start:end] for start, end, _ in hits]
+        if action == ACTION_MASK:
+            chars = list(text)
+            for start, end, hit_action in hits:
+                if hit_action >= ACTION_MASK:
+                    for k in range(start, end):
+                        chars[k] = self.replacement
+            text = ''.join(chars)
+        return FilterResult(action, text, words)